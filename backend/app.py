@@ -1,16 +1,94 @@
-from flask import Flask, request, jsonify
-from flask_cors import CORS
+from quart import Quart, Response, request
+from quart.json.provider import DefaultJSONProvider
+from quart_cors import cors
 from azure.core.credentials import AzureKeyCredential
-from azure.search.documents import SearchClient
-from azure.search.documents.models import VectorizableTextQuery
-from openai import AzureOpenAI
+from azure.core.pipeline.transport import AioHttpTransport
+from azure.search.documents.aio import SearchClient
+from openai import AsyncAzureOpenAI, DefaultAioHttpClient
+import aiohttp
+import httpx
 import os
+import logging
+import queue
+import atexit
+import asyncio
+import time
+import hashlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from logging.handlers import QueueHandler, QueueListener
 from dotenv import load_dotenv
+import numpy as np
+import orjson
 
+# Load .env before the local modules below read their settings from it
 load_dotenv()
 
-app = Flask(__name__)
-CORS(app)  # Enable CORS for React
+from embedding_batch import EmbeddingBatcher
+from rate_limits import wait_for_openai_quota, wait_for_search_quota
+from retry_policy import azure_retry
+from semantic_cache import ExactCache, GroundedCache
+from filters import build_filter_string
+from rag_core import (
+    FACET_VALUE_LIMIT,
+    NO_RESULTS_ANSWER,
+    SEARCH_SELECT_FIELDS,
+    SearchFailedError,
+    build_messages,
+    chat_input_error,
+    collect_fallback_filter_options,
+    exact_cache_key,
+    filters_scope,
+    format_filter_options,
+    normalize_query,
+    process_results,
+    trim_sample_document,
+)
+
+# Log level is set by the deployment; per-request detail is logged at DEBUG.
+# Handlers only enqueue records; a listener thread writes them to the console
+# so the event loop never blocks on stdout.
+log_console_handler = logging.StreamHandler()
+log_console_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+log_queue = queue.SimpleQueue()
+log_listener = QueueListener(log_queue, log_console_handler)
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    format="%(message)s",  # the console handler adds the timestamp, level and name
+    handlers=[QueueHandler(log_queue)]
+)
+log_listener.start()
+atexit.register(log_listener.stop)  # flush queued records on exit
+logger = logging.getLogger(__name__)
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Quart JSON provider backed by orjson, so request bodies are parsed in C"""
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj).decode()
+
+app = Quart(__name__)
+app.json = OrjsonProvider(app)
+# Origins allowed to call the API (comma-separated, "*" for any). Browsers may
+# reuse a preflight result for a day instead of repeating it before each POST.
+CORS_ALLOW_ORIGIN = [origin.strip() for origin in os.getenv("CORS_ALLOW_ORIGIN", "*").split(",")]
+app = cors(
+    app,
+    allow_origin=CORS_ALLOW_ORIGIN,
+    allow_methods=["GET", "POST"],
+    allow_headers=["Content-Type", "X-No-Cache"],
+    expose_headers=["X-Cache"],
+    max_age=86400
+)
+
+# Reject oversized bodies with a 413 from the Content-Length header, before
+# any of the body is read or parsed
+MAX_REQUEST_BYTES = int(os.getenv("MAX_REQUEST_BYTES", "65536"))
+app.config["MAX_CONTENT_LENGTH"] = MAX_REQUEST_BYTES
 
 # ENV VARIABLES (Updated to match your teammate's naming)
 AZURE_OPENAI_API_KEY = os.getenv("AZURE_OPENAI_API_KEY")
@@ -21,379 +99,811 @@ AZURE_SEARCH_ENDPOINT = os.getenv("AZURE_SEARCH_ENDPOINT")
 AZURE_SEARCH_INDEX = os.getenv("AZURE_SEARCH_INDEX", "my-demo-index")  # Default to teammate's index
 
 # Validate required environment variables
-required_env_vars = [
+required_env_vars = (
     "AZURE_OPENAI_API_KEY",
     "AZURE_OPENAI_ENDPOINT", 
     "AZURE_DEPLOYMENT_NAME",
     "AZURE_SEARCH_API_KEY",
     "AZURE_SEARCH_ENDPOINT"
-]
+)
 
-missing_vars = [var for var in required_env_vars if not os.getenv(var)]
+# Read once at import; the environment does not change while the app runs
+missing_vars = tuple(var for var in required_env_vars if not os.getenv(var))
 if missing_vars:
-    print(f"❌ Missing required environment variables: {', '.join(missing_vars)}")
-    print("📝 Please create a .env file in the backend directory with these variables")
+    logger.error("Missing required environment variables: %s", ", ".join(missing_vars))
+    logger.error("Please create a .env file in the backend directory with these variables")
+
+def json_response(body, status=200, headers=None):
+    """JSON response serialized with orjson, several times faster than jsonify's stdlib json.
+
+    Pre-serialized bytes are sent as-is, so constant payloads are encoded only once.
+    """
+    if not isinstance(body, bytes):
+        body = orjson.dumps(body)
+    return Response(body, status=status, headers=headers, mimetype="application/json")
+
+async def read_json_body():
+    """Parse a JSON request body with orjson straight from the raw bytes.
+
+    request.get_json() decodes the body to str first. Like get_json(silent=True),
+    this returns None for a non-JSON content type or a malformed body.
+    """
+    if not request.is_json:
+        return None
+    try:
+        return orjson.loads(await request.get_data())
+    except orjson.JSONDecodeError:
+        return None
+
+# Constant responses, serialized once at import
+SERVICES_UNAVAILABLE_BODY = orjson.dumps({
+    "error": "Azure services not available. Please check environment variables.",
+    "missing_vars": missing_vars
+})
+HEALTHY_BODY = orjson.dumps({
+    "status": "healthy",
+    "services": {"openai": True, "search": True},
+    "missing_env_vars": []
+})
+MOCK_FILTERS_BODY = orjson.dumps({
+    "authors": ["Sample Author 1", "Sample Author 2"],
+    "file_types": ["pdf", "docx", "txt"],
+    "note": "Mock data - Azure Search not configured"
+})
     
+# Connection pool sizing for the Azure HTTP transports. Keep the pool at least
+# as large as the expected number of concurrent requests so bursts reuse warm
+# TLS connections instead of opening new ones.
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "256"))
+HTTP_KEEPALIVE_SECONDS = int(os.getenv("HTTP_KEEPALIVE_SECONDS", "60"))
+
+# Dedicated pool for blocking work (e.g. embedding queries for the semantic
+# cache) so it never stalls the event loop that drives the Azure I/O
+BLOCKING_POOL_SIZE = int(os.getenv("BLOCKING_POOL_SIZE", "32"))
+EXECUTOR = ThreadPoolExecutor(max_workers=BLOCKING_POOL_SIZE, thread_name_prefix="rag-blocking")
+
 # Initialize Azure clients with error handling (using teammate's approach)
 openai_client = None
 search_client = None
+search_session = None
+filters_refresh_task = None
+filters_reload_task = None
+
+@app.before_serving
+async def init_azure_clients():
+    """Create the Azure clients inside the event loop that owns their connection pools"""
+    global openai_client, search_client, search_session, filters_refresh_task
 
-try:
-    if not missing_vars:
-        openai_client = AzureOpenAI(
-            azure_endpoint=AZURE_OPENAI_ENDPOINT,
-            api_key=AZURE_OPENAI_API_KEY,
-            api_version="2024-02-01"  # Use teammate's working API version
+    try:
+        if not missing_vars:
+            # Async clients so concurrent requests share one event loop while
+            # waiting on Azure instead of tying up a thread each
+            openai_client = AsyncAzureOpenAI(
+                azure_endpoint=AZURE_OPENAI_ENDPOINT,
+                api_key=AZURE_OPENAI_API_KEY,
+                api_version="2024-02-01",  # Use teammate's working API version
+                max_retries=0,  # retried by azure_retry instead
+                # aiohttp-backed transport: httpx's own pool degrades under high concurrency
+                http_client=DefaultAioHttpClient(
+                    limits=httpx.Limits(
+                        max_connections=HTTP_POOL_SIZE,
+                        max_keepalive_connections=HTTP_POOL_SIZE,
+                        keepalive_expiry=HTTP_KEEPALIVE_SECONDS
+                    ),
+                    timeout=30
+                )
+            )
+
+            search_session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=HTTP_POOL_SIZE, keepalive_timeout=HTTP_KEEPALIVE_SECONDS)
+            )
+            search_client = SearchClient(
+                endpoint=AZURE_SEARCH_ENDPOINT,
+                index_name=AZURE_SEARCH_INDEX,
+                credential=AzureKeyCredential(AZURE_SEARCH_API_KEY),
+                transport=AioHttpTransport(session=search_session, session_owner=False),
+                retry_total=0  # retried by azure_retry instead
+            )
+            logger.info("Azure clients initialized successfully")
+
+            # Keep /filters warm from startup on
+            filters_refresh_task = asyncio.create_task(refresh_filter_options_periodically())
+        else:
+            logger.warning("Azure clients not initialized due to missing environment variables")
+    except Exception as e:
+        logger.error("Failed to initialize Azure clients: %s", e)
+        openai_client = None
+        search_client = None
+
+# Upper bound on queries per /chat/batch request
+BATCH_MAX_QUERIES = 10
+
+# Exact-match response cache for /chat, keyed by (query, filters, deployment)
+EXACT_CACHE_MAX_ENTRIES = 1024
+EXACT_CACHE_TTL = int(os.getenv("EXACT_CACHE_TTL", "3600"))  # seconds
+EXACT_CACHE = ExactCache(max_entries=EXACT_CACHE_MAX_ENTRIES, ttl=EXACT_CACHE_TTL)
+
+# Semantic cache for paraphrased queries. Queries are embedded with a local
+# sentence-transformers model, or with an Azure OpenAI embedding deployment
+# when SEMANTIC_CACHE_EMBEDDING_DEPLOYMENT is set. Hits are only served after
+# re-validating them against fresh search results.
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+SEMANTIC_CACHE_MODEL = os.getenv("SEMANTIC_CACHE_MODEL", "all-MiniLM-L6-v2")
+SEMANTIC_CACHE_EMBEDDING_DEPLOYMENT = os.getenv("SEMANTIC_CACHE_EMBEDDING_DEPLOYMENT")
+SEMANTIC_CACHE_EMBEDDING_DIM = int(os.getenv("SEMANTIC_CACHE_EMBEDDING_DIM", "1536"))
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_TTL = int(os.getenv("SEMANTIC_CACHE_TTL", "86400"))  # seconds
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "10000"))  # per filter scope
+SEMANTIC_CACHE_ANN_MIN_ENTRIES = int(os.getenv("SEMANTIC_CACHE_ANN_MIN_ENTRIES", "2000"))
+SEMANTIC_CACHE_MIN_JACCARD = float(os.getenv("SEMANTIC_CACHE_MIN_JACCARD", "0.7"))
+SEMANTIC_CACHE_MIN_COVERAGE = float(os.getenv("SEMANTIC_CACHE_MIN_COVERAGE", "0.7"))
+
+embedding_model = None
+semantic_cache = None
+
+def make_semantic_cache(dim):
+    """Create the grounded semantic cache for embeddings of the given size"""
+    return GroundedCache(
+        dim=dim,
+        threshold=SEMANTIC_CACHE_THRESHOLD,
+        ttl=SEMANTIC_CACHE_TTL,
+        max_entries=SEMANTIC_CACHE_MAX_ENTRIES,
+        ann_min_entries=SEMANTIC_CACHE_ANN_MIN_ENTRIES,
+        min_jaccard=SEMANTIC_CACHE_MIN_JACCARD,
+        min_coverage=SEMANTIC_CACHE_MIN_COVERAGE
+    )
+
+if SEMANTIC_CACHE_ENABLED and SEMANTIC_CACHE_EMBEDDING_DEPLOYMENT:
+    semantic_cache = make_semantic_cache(SEMANTIC_CACHE_EMBEDDING_DIM)
+    logger.info("Semantic cache enabled (%s, threshold %s)", SEMANTIC_CACHE_EMBEDDING_DEPLOYMENT, SEMANTIC_CACHE_THRESHOLD)
+elif SEMANTIC_CACHE_ENABLED:
+    try:
+        from sentence_transformers import SentenceTransformer
+
+        embedding_model = SentenceTransformer(SEMANTIC_CACHE_MODEL)
+        semantic_cache = make_semantic_cache(embedding_model.get_sentence_embedding_dimension())
+        logger.info("Semantic cache enabled (%s, threshold %s)", SEMANTIC_CACHE_MODEL, SEMANTIC_CACHE_THRESHOLD)
+    except ImportError:
+        logger.warning("sentence-transformers not installed, semantic cache disabled")
+    except Exception as e:
+        logger.error("Failed to load semantic cache model: %s", e)
+        embedding_model = None
+        semantic_cache = None
+
+# Query embeddings keyed by normalized query text, so repeated queries skip
+# the embedding call even when the semantic cache misses
+EMBED_CACHE_MAX_ENTRIES = 10000
+EMBED_CACHE = OrderedDict()
+
+async def embed_query(query):
+    """Embed a query as an L2-normalized vector, reusing cached embeddings"""
+    normalized = normalize_query(query)
+    vector = EMBED_CACHE.get(normalized)
+    if vector is not None:
+        EMBED_CACHE.move_to_end(normalized)
+        return vector
+
+    if SEMANTIC_CACHE_EMBEDDING_DEPLOYMENT:
+        vector = np.asarray(await EMBEDDING_BATCHER.embed(normalized), dtype=np.float32)
+        vector /= np.linalg.norm(vector)
+    else:
+        # The local model is CPU-bound, so keep it off the event loop
+        vector = await asyncio.get_running_loop().run_in_executor(
+            EXECUTOR, partial(embedding_model.encode, normalized, normalize_embeddings=True)
         )
-        
-        search_client = SearchClient(
-            endpoint=AZURE_SEARCH_ENDPOINT,
-            index_name=AZURE_SEARCH_INDEX,
-            credential=AzureKeyCredential(AZURE_SEARCH_API_KEY)
+
+    EMBED_CACHE[normalized] = vector
+    while len(EMBED_CACHE) > EMBED_CACHE_MAX_ENTRIES:
+        EMBED_CACHE.popitem(last=False)
+    return vector
+
+embedding_dim_checked = False
+
+def embedding_fits_cache(vector):
+    """Check the first embedding against the semantic cache size, disabling the cache on a mismatch"""
+    global semantic_cache, embedding_dim_checked
+    if not embedding_dim_checked:
+        embedding_dim_checked = True
+        if vector.shape[-1] != semantic_cache.dim:
+            logger.error(
+                "Embeddings have %d dimensions but the semantic cache expects %d "
+                "(check SEMANTIC_CACHE_EMBEDDING_DIM); semantic cache disabled",
+                vector.shape[-1], semantic_cache.dim
+            )
+            semantic_cache = None
+    return semantic_cache is not None
+
+async def semantic_lookup(query, scope):
+    """Embed the query and return (vector, closest cached entry or None).
+
+    The cache is best-effort: if embedding or the lookup fails, the request
+    carries on as a miss with (None, None).
+    """
+    try:
+        query_vector = await embed_query(query)
+        if not embedding_fits_cache(query_vector):
+            return None, None
+        candidate = await asyncio.get_running_loop().run_in_executor(
+            EXECUTOR, semantic_cache.lookup, query_vector, scope
         )
-        print("✅ Azure clients initialized successfully")
+    except Exception as e:
+        logger.warning("Semantic cache lookup failed, treating as a miss: %s", e)
+        return None, None
+    return query_vector, candidate
+
+def cache_semantic_answer(query_vector, answer, chunk_versions, scope):
+    """Add a generated answer to the semantic cache; a failed write is only logged"""
+    try:
+        semantic_cache.add_answer(query_vector, answer, chunk_versions, scope)
+    except Exception as e:
+        logger.warning("Semantic cache write failed: %s", e)
+
+# Browser/proxy cache lifetimes (seconds) for GET endpoints that rarely change
+HEALTH_MAX_AGE = 10
+DEBUG_FIELDS_MAX_AGE = 300
+
+# Facet values only change when the index is updated, so /filters is cached
+FILTERS_TTL = int(os.getenv("FILTERS_TTL", "300"))  # seconds
+_FILTERS_CACHE = {"ts": 0, "payload": None, "body": None, "etag": None}
+
+def cache_filter_options(payload):
+    """Store the /filters payload along with its serialized body and ETag for cache hits"""
+    _FILTERS_CACHE["payload"] = payload
+    _FILTERS_CACHE["body"] = orjson.dumps(payload)
+    _FILTERS_CACHE["etag"] = hashlib.blake2b(_FILTERS_CACHE["body"], digest_size=16).hexdigest()
+    _FILTERS_CACHE["ts"] = time.time()
+
+def cached_filters_response(headers=None):
+    """Serve the cached /filters body, or a bodiless 304 if the client's copy is current"""
+    # no-cache makes browsers revalidate with If-None-Match instead of reusing blindly
+    headers = {"Cache-Control": "no-cache", **(headers or {})}
+    if request.if_none_match.contains(_FILTERS_CACHE["etag"]):
+        response = Response(b"", status=304, headers=headers)
     else:
-        print("⚠️ Azure clients not initialized due to missing environment variables")
-except Exception as e:
-    print(f"❌ Failed to initialize Azure clients: {str(e)}")
-    openai_client = None
-    search_client = None
+        response = json_response(_FILTERS_CACHE["body"], headers=headers)
+    response.set_etag(_FILTERS_CACHE["etag"])
+    return response
+
+@azure_retry
+async def fetch_results(**search_args):
+    """Run a search and read every result, so the round trip happens here"""
+    await wait_for_search_quota()
+    results = await search_client.search(**search_args)
+    return [result async for result in results]
+
+@azure_retry
+async def fetch_facets(**search_args):
+    """Run a faceted search and return its facets, so the round trip happens here"""
+    await wait_for_search_quota()
+    results = await search_client.search(**search_args)
+    return await results.get_facets() or {}
+
+@azure_retry
+async def create_completion(**completion_args):
+    """Create a chat completion with the shared Azure OpenAI client"""
+    await wait_for_openai_quota(completion_args["messages"])
+    return await openai_client.chat.completions.create(**completion_args)
+
+@azure_retry
+async def create_embedding(**embedding_args):
+    """Embed text with the shared Azure OpenAI client"""
+    return await openai_client.embeddings.create(**embedding_args)
+
+async def embed_texts(texts):
+    """Embed a batch of texts with one request, in input order"""
+    response = await create_embedding(model=SEMANTIC_CACHE_EMBEDDING_DEPLOYMENT, input=texts)
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+# Concurrent queries share embedding round trips
+EMBEDDING_BATCHER = EmbeddingBatcher(embed_texts)
+
+@app.after_serving
+async def close_azure_clients():
+    """Close the shared Azure connection pools on shutdown"""
+    if filters_refresh_task:
+        filters_refresh_task.cancel()
+    if filters_reload_task:
+        filters_reload_task.cancel()
+    if search_client:
+        await search_client.close()
+    if search_session:
+        await search_session.close()
+    if openai_client:
+        await openai_client.close()
+    EXECUTOR.shutdown(wait=False, cancel_futures=True)
 
 @app.route("/health", methods=["GET"])
-def health_check():
+async def health_check():
     """Health check endpoint to verify service status"""
+    if openai_client and search_client and not missing_vars:
+        # Status only changes on restart, so let probes and proxies reuse it briefly
+        return json_response(HEALTHY_BODY, headers={"Cache-Control": f"public, max-age={HEALTH_MAX_AGE}"})
+
     status = {
-        "status": "healthy",
+        "status": "unhealthy",
         "services": {
             "openai": openai_client is not None,
             "search": search_client is not None
         },
-        "missing_env_vars": missing_vars if missing_vars else []
+        "missing_env_vars": missing_vars
     }
-    
-    if missing_vars or not openai_client or not search_client:
-        status["status"] = "unhealthy"
-        return jsonify(status), 503
-    
-    return jsonify(status)
+    return json_response(status, 503)
 
-@app.route("/chat", methods=["POST"])
-def chat():
+# Search results for recent (query, filter) pairs. Kept briefly so bursts of
+# identical searches (retries, streamed re-asks, batch duplicates) skip the
+# round trip; results are only read, so cached lists are shared as-is.
+SEARCH_CACHE_MAX_ENTRIES = 256
+SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", "30"))  # seconds
+SEARCH_CACHE = ExactCache(max_entries=SEARCH_CACHE_MAX_ENTRIES, ttl=SEARCH_CACHE_TTL)
+
+async def search_documents(query, filter_string, use_cache=True):
+    """Search the index, reusing results for recent identical searches unless use_cache is False"""
+    cache_key = (query, filter_string)
+    results = SEARCH_CACHE.get(cache_key) if use_cache else None
+    if results is None:
+        results = await search_index(query, filter_string)
+        SEARCH_CACHE.set(cache_key, results)
+    return results
+
+async def search_index(query, filter_string):
+    """Search the index, retrying with minimal fields if the full select list fails"""
+    # First try basic search without vector search
     try:
-        # Check if Azure clients are available
-        if not openai_client or not search_client:
-            return jsonify({
-                "error": "Azure services not available. Please check environment variables.",
-                "missing_vars": missing_vars
-            }), 503
-
-        data = request.json
-        if not data:
-            return jsonify({"error": "No JSON data provided"}), 400
-            
-        query = data.get("query")
-        if not query:
-            return jsonify({"error": "Query parameter is required"}), 400
-            
-        filters = data.get("filters", {})
-
-        print(f"🔍 Processing query: {query}")
-        if filters:
-            print(f"📊 Applied filters: {filters}")
-
-        # Map frontend filter names to Azure AI Search field names
-        field_mapping = {
-            'authors': 'author',
-            'file_type': 'documentType',
-            'file_types': 'data_product_type',
-            'content_type': 'documentType',
-            'extension': 'extension',
-            'language': 'language',
-            'topic': 'topic',
-            'business_unit': 'owner_business_unit',
-            'owner_business': 'owner_business',
-            'user_group': 'user_group'
+        logger.debug("Attempting basic search first...")
+        search_args = {
+            "search_text": query,
+            "select": SEARCH_SELECT_FIELDS,
+            "top": 5
         }
+        if filter_string:
+            search_args["filter"] = filter_string
 
-        # Build filter string
-        filter_conditions = []
-        for key, value in filters.items():
-            if value and str(value).strip():
-                # Map frontend field name to Azure field name
-                azure_field = field_mapping.get(key, key)
-                filter_conditions.append(f"{azure_field} eq '{value}'")
-        filter_string = ' and '.join(filter_conditions) if filter_conditions else None
-        
-        print(f"🔍 Filter string: {filter_string}")
+        logger.debug("Search args: %s", search_args)
+        results = await fetch_results(**search_args)
+        logger.debug("Basic search successful")
+        return results
 
-        # First try basic search without vector search
+    except Exception as search_error:
+        logger.warning("Basic search failed (%s): %s", type(search_error).__name__, search_error)
+
+        # Try with minimal fields if field selection is the issue
         try:
-            print("🔍 Attempting basic search first...")
-            search_args = {
+            logger.info("Trying search with minimal fields...")
+            minimal_search_args = {
                 "search_text": query,
-                "select": [
-                    "parent_id", "title", "chunk_id", "chunk", "documentType", "author",
-                    "Documentid", "document_title", "language", "topic", "summary", "keywords",
-                    "element", "entities", "user_group", "extension", "data_product_id",
-                    "data_product_name", "data_product_type", "data_product_description",
-                    "owner_business_unit", "owner_business", "owner_technical", "owner_group",
-                    "storage_location", "version", "creation_date", "update_date"
-                ],
                 "top": 5
             }
             if filter_string:
-                search_args["filter"] = filter_string
-
-            print(f"🔍 Search args: {search_args}")
-            results = search_client.search(**search_args)
-            print("✅ Basic search successful")
-            
-        except Exception as search_error:
-            print(f"❌ Basic search failed: {str(search_error)}")
-            print(f"❌ Search error type: {type(search_error)}")
-            
-            # Try with minimal fields if field selection is the issue
-            try:
-                print("🔍 Trying search with minimal fields...")
-                minimal_search_args = {
-                    "search_text": query,
-                    "top": 5
-                }
-                if filter_string:
-                    minimal_search_args["filter"] = filter_string
-                
-                results = search_client.search(**minimal_search_args)
-                print("✅ Minimal field search successful")
-                
-            except Exception as minimal_error:
-                print(f"❌ Minimal search also failed: {str(minimal_error)}")
-                return jsonify({
-                    "error": f"Search failed: {str(minimal_error)}",
-                    "original_error": str(search_error),
-                    "filter_applied": filter_string
-                }), 500
+                minimal_search_args["filter"] = filter_string
+
+            results = await fetch_results(**minimal_search_args)
+            logger.info("Minimal field search successful")
+            return results
+
+        except Exception as minimal_error:
+            logger.error("Minimal search also failed: %s", minimal_error)
+            raise SearchFailedError(minimal_error, search_error)
+
+def sse_event(data):
+    """Format a Server-Sent Events frame"""
+    return f"data: {orjson.dumps(data).decode()}\n\n"
+
+async def answer_query(query, filters, use_cache=True):
+    """Run the search and completion for one query and return (payload, status)"""
+    try:
+        logger.info("Processing query: %s", query)
+        if filters:
+            logger.info("Applied filters: %s", filters)
+
+        # Serve repeated (query, filters) pairs straight from the exact cache
+        cache_key = exact_cache_key(query, filters, AZURE_DEPLOYMENT_NAME)
+        if use_cache:
+            cached_payload = EXACT_CACHE.get(cache_key)
+            if cached_payload is not None:
+                logger.debug("Exact cache hit")
+                return cached_payload, 200
+
+        filter_string = build_filter_string(filters)
+        logger.debug("Filter string: %s", filter_string)
+
+        # Look for a paraphrase of an earlier query on the blocking pool while
+        # the search is in flight. The candidate is only served once it has
+        # been validated against the fresh results below.
+        cache_scope = filters_scope(filters, AZURE_DEPLOYMENT_NAME)
+        pending = [search_documents(query, filter_string, use_cache)]
+        if use_cache and semantic_cache:
+            pending.append(semantic_lookup(query, cache_scope))
 
-        # Process results
         try:
-            print("🔍 Processing search results...")
-            retrieved_context = ""
-            sources = []
-            result_count = 0
-
-            for result in results:
-                print(f"🔍 Processing result: {dict(result).keys()}")
-                
-                # Use 'chunk' field for content, fallback to other possible field names
-                chunk = result.get('chunk', result.get('content', result.get('text', '')))
-                if not chunk:
-                    # Try to get any text-like field if chunk is empty
-                    chunk = result.get('summary', result.get('title', ''))
-                
-                retrieved_context += chunk + "\n"
-                sources.append({
-                    'title': result.get('title', result.get('document_title', 'N/A')),
-                    'author': result.get('author', 'N/A'),
-                    'document_title': result.get('document_title', result.get('title', 'N/A')),
-                    'document_type': result.get('documentType', 'N/A'),
-                    'language': result.get('language', 'N/A'),
-                    'topic': result.get('topic', 'N/A'),
-                    'data_product_type': result.get('data_product_type', 'N/A'),
-                    'owner_business': result.get('owner_business', 'N/A'),
-                    'user_group': result.get('user_group', 'N/A'),
-                    'extension': result.get('extension', 'N/A'),
-                    'document_id': result.get('Documentid', result.get('parent_id', 'N/A')),
-                    'chunk_id': result.get('chunk_id', 'N/A'),
-                    'creation_date': str(result.get('creation_date', 'N/A')),
-                    'update_date': str(result.get('update_date', 'N/A'))
-                })
-                result_count += 1
+            results, *semantic_lookups = await asyncio.gather(*pending)
+        except SearchFailedError as search_error:
+            return {
+                "error": f"Search failed: {str(search_error)}",
+                "original_error": str(search_error.original_error),
+                "filter_applied": filter_string
+            }, 500
+        query_vector, semantic_candidate = semantic_lookups[0] if semantic_lookups else (None, None)
 
-            print(f"✅ Processed {result_count} results")
-            print(f"🔍 Retrieved context length: {len(retrieved_context)}")
+        # Process results
+        try:
+            logger.debug("Processing search results...")
+            retrieved_context, sources, chunk_versions = process_results(results)
+            result_count = len(sources)
+            logger.debug("Processed %d results", result_count)
+            logger.debug("Retrieved context length: %d", len(retrieved_context))
 
             if not retrieved_context.strip():
-                print("⚠️ No relevant documents found")
-                return jsonify({
-                    "answer": "I couldn't find any relevant information in the documents with the applied filters. Please try adjusting your query or filters.",
+                logger.warning("No relevant documents found")
+                return {
+                    "answer": NO_RESULTS_ANSWER,
                     "sources": [],
                     "result_count": 0
-                })
+                }, 200
 
         except Exception as process_error:
-            print(f"❌ Error processing results: {str(process_error)}")
-            return jsonify({
+            logger.error("Error processing results: %s", process_error)
+            return {
                 "error": f"Error processing search results: {str(process_error)}"
-            }), 500
+            }, 500
+
+        # Serve the semantic cache candidate if the evidence still supports it,
+        # with sources rebuilt from the fresh results
+        if semantic_candidate is not None:
+            failed_gate = semantic_cache.validate(semantic_candidate, chunk_versions, retrieved_context)
+            if failed_gate is None:
+                logger.debug("Semantic cache hit")
+                payload = {
+                    "answer": semantic_candidate["answer"],
+                    "sources": sources,
+                    "result_count": result_count,
+                    "filters_applied": filter_string
+                }
+                EXACT_CACHE.set(cache_key, payload)
+                return payload, 200
+            logger.debug("Semantic cache candidate rejected by gate %s", failed_gate)
 
         # Generate response with OpenAI
         try:
-            print("🔍 Generating OpenAI response...")
-            system_prompt = (
-                "You are a helpful AI assistant. Answer the user's question based ONLY on the context "
-                "provided below. If the answer is not in the context, say 'I don't have enough information "
-                "in the provided documents to answer that.' Do not make up information. Provide clear, concise answers."
-            )
-            augmented_prompt = f"CONTEXT FROM DOCUMENTS:\n{retrieved_context}\n\nQUESTION:\n{query}"
-
-            response = openai_client.chat.completions.create(
+            logger.debug("Generating OpenAI response...")
+            response = await create_completion(
                 model=AZURE_DEPLOYMENT_NAME,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": augmented_prompt}
-                ],
+                messages=build_messages(retrieved_context, query),
                 temperature=0.2
             )
 
             answer = response.choices[0].message.content
-            print(f"✅ Generated response for query: {query}")
-            
-            return jsonify({
-                "answer": answer,
-                "sources": sources,
-                "result_count": result_count,
-                "filters_applied": filter_string
-            })
-            
+            logger.info("Generated response for query: %s", query)
+
         except Exception as openai_error:
-            print(f"❌ OpenAI error: {str(openai_error)}")
-            return jsonify({
+            logger.error("OpenAI error: %s", openai_error)
+            return {
                 "error": f"Error generating response: {str(openai_error)}",
                 "sources": sources,
                 "result_count": result_count
-            }), 500
-        
+            }, 500
+
+        payload = {
+            "answer": answer,
+            "sources": sources,
+            "result_count": result_count,
+            "filters_applied": filter_string
+        }
+        if use_cache and answer and answer.strip():
+            EXACT_CACHE.set(cache_key, payload)
+            if query_vector is not None:
+                cache_semantic_answer(query_vector, answer, chunk_versions, cache_scope)
+        return payload, 200
+
     except Exception as e:
-        print(f"❌ Unexpected error in chat endpoint: {str(e)}")
-        print(f"❌ Error type: {type(e)}")
-        import traceback
-        print(f"❌ Traceback: {traceback.format_exc()}")
-        return jsonify({
+        logger.exception("Unexpected error in chat endpoint: %s", e)
+        return {
             "error": f"Failed to process chat request: {str(e)}"
-        }), 500
+        }, 500
+
+@app.route("/chat", methods=["POST"])
+async def chat():
+    # Check if Azure clients are available
+    if not openai_client or not search_client:
+        return json_response(SERVICES_UNAVAILABLE_BODY, 503)
+
+    data = await read_json_body()
+    if not data or not isinstance(data, dict):
+        return json_response({"error": "No JSON data provided"}, 400)
+
+    query = data.get("query")
+    filters = data.get("filters", {})
+    input_error = chat_input_error(query, filters)
+    if input_error:
+        return json_response({"error": input_error}, 400)
+
+    # Send an X-No-Cache header to bypass the caches while debugging
+    use_cache = not request.headers.get("X-No-Cache")
+    payload, status = await answer_query(query, filters, use_cache)
+    return json_response(payload, status)
+
+@app.route("/chat/batch", methods=["POST"])
+async def chat_batch():
+    """Answer several queries in one round-trip, running them concurrently.
+
+    Expects {"queries": [...], "filters": {...}} and returns {"results": [...]}
+    in the order of the queries; identical queries are only answered once.
+    """
+    if not openai_client or not search_client:
+        return json_response(SERVICES_UNAVAILABLE_BODY, 503)
+
+    data = await read_json_body()
+    if not data or not isinstance(data, dict):
+        return json_response({"error": "No JSON data provided"}, 400)
+
+    queries = data.get("queries")
+    if not isinstance(queries, list) or not queries or not all(isinstance(q, str) and q for q in queries):
+        return json_response({"error": "queries must be a non-empty list of strings"}, 400)
+    if len(queries) > BATCH_MAX_QUERIES:
+        return json_response({"error": f"At most {BATCH_MAX_QUERIES} queries per batch"}, 400)
+
+    filters = data.get("filters", {})
+    for query in queries:
+        input_error = chat_input_error(query, filters)
+        if input_error:
+            return json_response({"error": input_error}, 400)
+    use_cache = not request.headers.get("X-No-Cache")
+    unique_queries = list(dict.fromkeys(queries))
+    answers = await asyncio.gather(*(answer_query(q, filters, use_cache) for q in unique_queries))
+    by_query = {q: payload for q, (payload, _) in zip(unique_queries, answers)}
+    return json_response({"results": [by_query[q] for q in queries]})
+
+@app.route("/chat/stream", methods=["POST"])
+async def chat_stream():
+    """Stream the answer as Server-Sent Events so the first tokens arrive early.
+
+    Emits a frame with the sources as soon as the search returns, then
+    {"delta": ...} frames as tokens are generated, then {"done": true}
+    (or a frame with "error" if the request failed).
+    """
+    if not openai_client or not search_client:
+        return json_response(SERVICES_UNAVAILABLE_BODY, 503)
+
+    data = await read_json_body()
+    if not data or not isinstance(data, dict):
+        return json_response({"error": "No JSON data provided"}, 400)
+
+    query = data.get("query")
+    filters = data.get("filters", {})
+    input_error = chat_input_error(query, filters)
+    if input_error:
+        return json_response({"error": input_error}, 400)
+
+    logger.info("Streaming query: %s", query)
+
+    use_cache = not request.headers.get("X-No-Cache")
+    cache_key = exact_cache_key(query, filters, AZURE_DEPLOYMENT_NAME)
+
+    async def generate():
+        if use_cache:
+            cached_payload = EXACT_CACHE.get(cache_key)
+            if cached_payload is not None:
+                logger.debug("Exact cache hit")
+                yield sse_event({
+                    "sources": cached_payload["sources"],
+                    "result_count": cached_payload["result_count"],
+                    "filters_applied": cached_payload["filters_applied"]
+                })
+                yield sse_event({"delta": cached_payload["answer"]})
+                yield sse_event({"done": True})
+                return
+
+        try:
+            filter_string = build_filter_string(filters)
+            results = await search_documents(query, filter_string, use_cache)
+            retrieved_context, sources, _ = process_results(results)
+
+            if not retrieved_context.strip():
+                logger.warning("No relevant documents found")
+                yield sse_event({"sources": [], "result_count": 0})
+                yield sse_event({"delta": NO_RESULTS_ANSWER})
+                yield sse_event({"done": True})
+                return
+
+            # Sources are known before generation starts, so the client can
+            # show citations while the answer is still streaming
+            yield sse_event({
+                "sources": sources,
+                "result_count": len(sources),
+                "filters_applied": filter_string
+            })
+
+            stream = await create_completion(
+                model=AZURE_DEPLOYMENT_NAME,
+                messages=build_messages(retrieved_context, query),
+                temperature=0.2,
+                stream=True
+            )
+
+            answer_parts = []
+            async for chunk in stream:
+                # Azure sends content-filter frames without choices
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    answer_parts.append(delta)
+                    yield sse_event({"delta": delta})
+
+            payload = {
+                "answer": "".join(answer_parts),
+                "sources": sources,
+                "result_count": len(sources),
+                "filters_applied": filter_string
+            }
+            # An empty answer (e.g. every delta filtered) would be served to later queries
+            if use_cache and payload["answer"].strip():
+                EXACT_CACHE.set(cache_key, payload)
+            logger.info("Streamed response for query: %s", query)
+
+            yield sse_event({"done": True})
+
+        except Exception as e:
+            logger.error("Error in chat stream: %s", e)
+            yield sse_event({"error": f"Failed to process chat request: {str(e)}", "done": True})
+
+    response = Response(generate(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache"})
+    # Quart cuts responses off after RESPONSE_TIMEOUT (60 s) without a final
+    # frame; long answers behind limiter and retry waits must run to "done"
+    response.timeout = None
+    return response
+
+async def load_filter_options():
+    """Read the filter options from the index facets and cache them"""
+    logger.debug("Fetching filter options from Azure Search...")
+
+    # Use actual field names from the index
+    filter_options = {
+        'author': [],
+        'documentType': [],
+        'language': [],
+        'topic': [],
+        'data_product_type': [],
+        'owner_business_unit': [],
+        'owner_business': [],
+        'user_group': [],
+        'extension': []
+    }
+
+    # One faceted query returns every field's values in a single round trip
+    facets_by_field = await fetch_facets(
+        search_text="*",
+        facets=[f"{field},count:{FACET_VALUE_LIMIT}" for field in filter_options],
+        top=0
+    )
+    for field in filter_options:
+        facets = facets_by_field.get(field, [])
+        filter_options[field] = [facet['value'] for facet in facets if facet['count'] > 0]
+
+    logger.debug("Found filter options: %d categories", len(filter_options))
+
+    # Convert to frontend's expected format
+    payload = format_filter_options(filter_options)
+    cache_filter_options(payload)
+    return payload
+
+async def reload_filter_options():
+    """Reload the filter options, scanning documents if the faceted query fails"""
+    try:
+        await load_filter_options()
+    except Exception as facet_error:
+        logger.warning("Faceted search failed, using basic search: %s", facet_error)
+        cache_filter_options(await collect_fallback_filter_options(search_client))
+
+def log_filters_reload_failure(task):
+    """Log a failed reload, which nobody awaits when it was started for a stale hit"""
+    if not task.cancelled() and task.exception():
+        logger.warning("Filter options reload failed: %s", task.exception())
+
+def start_filters_reload():
+    """Start a filter options reload unless one is already running, and return it"""
+    global filters_reload_task
+    if filters_reload_task is None or filters_reload_task.done():
+        filters_reload_task = asyncio.create_task(reload_filter_options())
+        filters_reload_task.add_done_callback(log_filters_reload_failure)
+    return filters_reload_task
+
+async def refresh_filter_options_periodically():
+    """Reload the filter options in the background so requests never wait on a miss"""
+    while True:
+        try:
+            # Joins a reload already started for a stale hit instead of
+            # querying facets twice; shielded so this loop's cancellation
+            # doesn't cancel a reload that requests are waiting on
+            await asyncio.shield(start_filters_reload())
+        except Exception:
+            pass  # logged by log_filters_reload_failure
+        await asyncio.sleep(max(FILTERS_TTL / 2, 1))
 
 @app.route("/filters", methods=["GET"])
-def get_filter_options():
+async def get_filter_options():
     """Get available filter options from the search index"""
     try:
         # Check if Azure search client is available
         if not search_client:
-            print("❌ Search client not available for filters endpoint")
-            return jsonify({
-                "authors": ["Sample Author 1", "Sample Author 2"],
-                "file_types": ["pdf", "docx", "txt"],
-                "note": "Mock data - Azure Search not configured"
-            })
+            logger.warning("Search client not available for filters endpoint")
+            return json_response(MOCK_FILTERS_BODY)
 
-        print("🔍 Fetching filter options from Azure Search...")
-        
-        # Use actual field names from the index
-        filter_options = {
-            'author': [],
-            'documentType': [],
-            'language': [],
-            'topic': [],
-            'data_product_type': [],
-            'owner_business_unit': [],
-            'owner_business': [],
-            'user_group': [],
-            'extension': []
-        }
+        if _FILTERS_CACHE["payload"]:
+            if time.time() - _FILTERS_CACHE["ts"] < FILTERS_TTL:
+                return cached_filters_response()
+            # Serve the last known options right away and reload them off the request path
+            start_filters_reload()
+            return cached_filters_response(headers={"X-Cache": "STALE"})
+
+        # Nothing cached yet: concurrent callers wait on one shared reload.
+        # shield() keeps a disconnecting client from cancelling it for the others.
+        await asyncio.shield(start_filters_reload())
+        return cached_filters_response()
 
-        try:
-            for field in filter_options.keys():
-                search_results = search_client.search(
-                    search_text="*",
-                    facets=[field],
-                    top=0
-                )
-                if hasattr(search_results, 'get_facets') and search_results.get_facets():
-                    facets = search_results.get_facets().get(field, [])
-                    filter_options[field] = [facet['value'] for facet in facets if facet['count'] > 0]
-
-            print(f"✅ Found filter options: {len(filter_options)} categories")
-            
-            # Convert to frontend's expected format
-            return jsonify({
-                "authors": filter_options.get('author', []),
-                "file_types": filter_options.get('documentType', []) + filter_options.get('data_product_type', []),
-                "document_types": filter_options.get('documentType', []),
-                "languages": filter_options.get('language', []),
-                "topics": filter_options.get('topic', []),
-                "business_units": filter_options.get('owner_business_unit', []),
-                "owner_business": filter_options.get('owner_business', []),
-                "user_groups": filter_options.get('user_group', []),
-                "extensions": filter_options.get('extension', []),
-                "data_product_types": filter_options.get('data_product_type', [])
-            })
-            
-        except Exception as facet_error:
-            print(f"⚠️ Faceted search failed, using basic search: {facet_error}")
-            # Fallback to basic search if facets fail
-            authors = set()
-            topics = set()
-            languages = set()
-            
-            results = search_client.search("*", top=100)
-            for doc in results:
-                if doc.get("author"):
-                    authors.add(doc.get("author"))
-                if doc.get("topic"):
-                    topics.add(doc.get("topic"))
-                if doc.get("language"):
-                    languages.add(doc.get("language"))
-            
-            return jsonify({
-                "authors": sorted(list(authors)),
-                "topics": sorted(list(topics)),
-                "languages": sorted(list(languages)),
-                "file_types": ["pdf", "docx", "txt"]
-            })
-        
     except Exception as e:
-        print(f"❌ Error in filters endpoint: {str(e)}")
-        return jsonify({
+        logger.error("Error in filters endpoint: %s", e)
+        return json_response({
             "authors": ["Sample Author"],
             "file_types": ["pdf", "docx"],
             "error": f"Failed to fetch from Azure Search: {str(e)}",
             "note": "Returning mock data due to error"
         })
 
+@app.route("/filters/refresh", methods=["POST"])
+async def refresh_filter_options():
+    """Drop the cached filter options so the next /filters call re-reads the index"""
+    _FILTERS_CACHE["payload"] = None
+    _FILTERS_CACHE["body"] = None
+    _FILTERS_CACHE["etag"] = None
+    _FILTERS_CACHE["ts"] = 0
+    return json_response({"message": "Filter options cache cleared"})
+
+@app.route("/cache/invalidate", methods=["POST"])
+async def invalidate_chat_cache():
+    """Drop cached /chat answers, e.g. after the search index has been updated"""
+    EXACT_CACHE.clear()
+    SEARCH_CACHE.clear()
+    if semantic_cache:
+        semantic_cache.clear()
+    return json_response({"message": "Chat cache cleared"})
+
 @app.route("/debug/fields", methods=["GET"])
-def debug_fields():
+async def debug_fields():
     """Debug endpoint to discover available fields in the search index"""
     try:
         if not search_client:
-            return jsonify({"error": "Search client not available"}), 503
+            return json_response({"error": "Search client not available"}, 503)
         
         # Get a sample document to see what fields are available
-        results = search_client.search("*", top=1)
+        results = await search_client.search("*", top=1)
         
         sample_doc = None
         available_fields = []
         
-        for result in results:
+        async for result in results:
             sample_doc = dict(result)
             available_fields = list(sample_doc.keys())
             break
         
         if not sample_doc:
-            return jsonify({
+            return json_response({
                 "message": "No documents found in index",
                 "available_fields": [],
                 "sample_document": None
             })
         
-        return jsonify({
+        return json_response({
             "message": "Available fields in your Azure AI Search index",
             "available_fields": sorted(available_fields),
-            "sample_document": sample_doc,
+            "sample_document": trim_sample_document(sample_doc),
             "field_count": len(available_fields)
-        })
+        }, headers={"Cache-Control": f"max-age={DEBUG_FIELDS_MAX_AGE}"})
         
     except Exception as e:
-        return jsonify({
+        return json_response({
             "error": f"Failed to fetch field information: {str(e)}"
-        }), 500
+        }, 500)
 
 if __name__ == "__main__":
-    app.run(debug=True, host='127.0.0.1', port=5000)
+    # Development server only - use gunicorn with uvicorn workers (see gunicorn.conf.py) in production
+    app.run(debug=os.getenv("FLASK_DEBUG", "false").lower() == "true", host='127.0.0.1', port=5000)
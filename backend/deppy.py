@@ -1,10 +1,40 @@
 import azure.functions as func
+import aiohttp
+import asyncio
+import hashlib
 import logging
-import json
+import httpx
+import orjson
 import os
+import time
+import numpy as np
 from azure.core.credentials import AzureKeyCredential
-from azure.search.documents import SearchClient
-from openai import AzureOpenAI
+from azure.core.pipeline.transport import AioHttpTransport
+from azure.search.documents.aio import SearchClient
+from openai import AsyncAzureOpenAI, DefaultAioHttpClient
+from embedding_batch import EmbeddingBatcher
+from filters import build_filter_string
+from rate_limits import wait_for_openai_quota, wait_for_search_quota
+from retry_policy import azure_retry
+from semantic_cache import ExactCache, GroundedCache
+from rag_core import (
+    FACET_VALUE_LIMIT,
+    NO_RESULTS_ANSWER,
+    SEARCH_SELECT_FIELDS,
+    SearchFailedError,
+    build_messages,
+    chat_input_error,
+    collect_fallback_filter_options,
+    exact_cache_key,
+    filters_scope,
+    format_filter_options,
+    normalize_query,
+    process_results,
+    trim_sample_document,
+)
+
+# The Functions host attaches its own handlers; per-request detail is logged at DEBUG
+logger = logging.getLogger(__name__)
 
 # Create the main function app
 app = func.FunctionApp(http_auth_level=func.AuthLevel.ANONYMOUS)
@@ -18,226 +48,417 @@ AZURE_SEARCH_ENDPOINT = os.getenv("AZURE_SEARCH_ENDPOINT")
 AZURE_SEARCH_INDEX = os.getenv("AZURE_SEARCH_INDEX", "my-demo-index")
 
 # Validate required environment variables
-required_env_vars = [
+required_env_vars = (
     "AZURE_OPENAI_API_KEY",
     "AZURE_OPENAI_ENDPOINT", 
     "AZURE_DEPLOYMENT_NAME",
     "AZURE_SEARCH_API_KEY",
     "AZURE_SEARCH_ENDPOINT"
-]
+)
 
-missing_vars = [var for var in required_env_vars if not os.getenv(var)]
+# Read once at import; the environment does not change while the app runs
+missing_vars = tuple(var for var in required_env_vars if not os.getenv(var))
 if missing_vars:
-    logging.warning(f"Missing required environment variables: {', '.join(missing_vars)}")
+    logger.warning("Missing required environment variables: %s", ", ".join(missing_vars))
+
+# Constant responses, serialized once at import
+SERVICES_UNAVAILABLE_BODY = orjson.dumps({
+    "error": "Azure services not available. Please check environment variables.",
+    "missing_vars": missing_vars
+})
+HEALTHY_BODY = orjson.dumps({
+    "status": "healthy",
+    "services": {"openai": True, "search": True},
+    "missing_env_vars": []
+})
+MOCK_FILTERS_BODY = orjson.dumps({
+    "authors": ["Sample Author 1", "Sample Author 2"],
+    "file_types": ["pdf", "docx", "txt"],
+    "note": "Mock data - Azure Search not configured"
+})
+
+# Connection pool sizing for the Azure HTTP transports, shared by every
+# invocation on this instance (see app.py)
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "256"))
+HTTP_KEEPALIVE_SECONDS = int(os.getenv("HTTP_KEEPALIVE_SECONDS", "60"))
+
+class PooledAioHttpTransport(AioHttpTransport):
+    """Search transport whose session is sized like app.py's connection pool.
+
+    aiohttp sessions must be created inside a running event loop, and the
+    Functions host only has one once invocations start. So the session is
+    opened on first use, inside the host's loop, and reused by every later
+    invocation on this instance.
+    """
+
+    async def open(self):
+        if self.session is None:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=HTTP_POOL_SIZE, keepalive_timeout=HTTP_KEEPALIVE_SECONDS),
+                cookie_jar=aiohttp.DummyCookieJar(),
+                auto_decompress=False,  # azure-core decompresses responses itself
+                trust_env=True
+            )
+        await super().open()
 
 # Initialize Azure clients
 openai_client = None
 search_client = None
 
-try:
-    if not missing_vars:
-        openai_client = AzureOpenAI(
+# A failed construction is retried by later invocations, at most this often
+CLIENT_INIT_RETRY_SECONDS = 30
+_client_init_retry_at = 0
+
+async def init_azure_clients():
+    """Create the shared Azure clients, leaving both None if construction fails"""
+    global openai_client, search_client, _client_init_retry_at
+
+    if missing_vars:
+        logger.warning("Azure clients not initialized due to missing environment variables")
+        return
+
+    try:
+        # Async clients so the Functions host can run other invocations on
+        # its event loop while these wait on Azure
+        new_openai_client = AsyncAzureOpenAI(
             azure_endpoint=AZURE_OPENAI_ENDPOINT,
             api_key=AZURE_OPENAI_API_KEY,
-            api_version="2024-02-01"
+            api_version="2024-02-01",
+            max_retries=0,  # retried by azure_retry instead
+            # aiohttp-backed transport: httpx's own pool degrades under high concurrency
+            http_client=DefaultAioHttpClient(
+                limits=httpx.Limits(
+                    max_connections=HTTP_POOL_SIZE,
+                    max_keepalive_connections=HTTP_POOL_SIZE,
+                    keepalive_expiry=HTTP_KEEPALIVE_SECONDS
+                ),
+                timeout=30
+            )
         )
-        
-        search_client = SearchClient(
+    except Exception as e:
+        logger.error("Failed to initialize Azure clients: %s", e)
+        _client_init_retry_at = time.monotonic() + CLIENT_INIT_RETRY_SECONDS
+        return
+
+    try:
+        new_search_client = SearchClient(
             endpoint=AZURE_SEARCH_ENDPOINT,
             index_name=AZURE_SEARCH_INDEX,
-            credential=AzureKeyCredential(AZURE_SEARCH_API_KEY)
+            credential=AzureKeyCredential(AZURE_SEARCH_API_KEY),
+            transport=PooledAioHttpTransport(),
+            retry_total=0  # retried by azure_retry instead
         )
-        logging.info("Azure clients initialized successfully")
-    else:
-        logging.warning("Azure clients not initialized due to missing environment variables")
-except Exception as e:
-    logging.error(f"Failed to initialize Azure clients: {str(e)}")
-    openai_client = None
-    search_client = None
+    except Exception as e:
+        logger.error("Failed to initialize Azure clients: %s", e)
+        _client_init_retry_at = time.monotonic() + CLIENT_INIT_RETRY_SECONDS
+        # Each retry builds a new OpenAI client, so don't leave this one's session open
+        await new_openai_client.close()
+        return
+
+    openai_client, search_client = new_openai_client, new_search_client
+    logger.info("Azure clients initialized successfully")
+
+async def ensure_azure_clients():
+    """Create the clients on first use, and retry a failed construction instead of answering 503 until the instance recycles"""
+    if openai_client and search_client or missing_vars:
+        return
+    if time.monotonic() >= _client_init_retry_at:
+        await init_azure_clients()
+
+@azure_retry
+async def fetch_results(**search_args):
+    """Run a search and read every result, retrying throttled calls"""
+    await wait_for_search_quota()
+    results = await search_client.search(**search_args)
+    return [result async for result in results]
+
+@azure_retry
+async def fetch_facets(**search_args):
+    """Run a faceted search and return its facets, retrying throttled calls"""
+    await wait_for_search_quota()
+    results = await search_client.search(**search_args)
+    return await results.get_facets() or {}
+
+@azure_retry
+async def create_completion(**completion_args):
+    """Create a chat completion, retrying throttled calls"""
+    await wait_for_openai_quota(completion_args["messages"])
+    return await openai_client.chat.completions.create(**completion_args)
+
+@azure_retry
+async def create_embedding(**embedding_args):
+    """Embed text, retrying throttled calls"""
+    return await openai_client.embeddings.create(**embedding_args)
+
+async def embed_texts(texts):
+    """Embed a batch of texts with one request, in input order"""
+    response = await create_embedding(model=SEMANTIC_CACHE_EMBEDDING_DEPLOYMENT, input=texts)
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+# Concurrent invocations on this instance share embedding round trips
+EMBEDDING_BATCHER = EmbeddingBatcher(embed_texts)
+
+# Search results for recent (query, filter) pairs. Kept briefly so bursts of
+# identical searches (retries, regenerated answers, batch duplicates) skip the
+# round trip; results are only read, so cached lists are shared as-is.
+SEARCH_CACHE_MAX_ENTRIES = 256
+SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", "30"))  # seconds
+SEARCH_CACHE = ExactCache(max_entries=SEARCH_CACHE_MAX_ENTRIES, ttl=SEARCH_CACHE_TTL)
+
+async def search_documents(query, filter_string):
+    """Search the index, reusing results for recent identical searches"""
+    cache_key = (query, filter_string)
+    results = SEARCH_CACHE.get(cache_key)
+    if results is None:
+        results = await search_index(query, filter_string)
+        SEARCH_CACHE.set(cache_key, results)
+    return results
+
+async def search_index(query, filter_string):
+    """Search the index, retrying with minimal fields if the full select list fails"""
+    try:
+        search_args = {
+            "search_text": query,
+            "select": SEARCH_SELECT_FIELDS,
+            "top": 5
+        }
+        if filter_string:
+            search_args["filter"] = filter_string
+
+        results = await fetch_results(**search_args)
+        logger.debug("Search successful")
+        return results
+
+    except Exception as search_error:
+        logger.error("Search failed: %s", search_error)
+        # Try with minimal fields
+        try:
+            logger.info("Trying search with minimal fields...")
+            minimal_search_args = {
+                "search_text": query,
+                "top": 5
+            }
+            if filter_string:
+                minimal_search_args["filter"] = filter_string
+
+            results = await fetch_results(**minimal_search_args)
+            logger.info("Minimal field search successful")
+            return results
+
+        except Exception as minimal_error:
+            logger.error("Minimal search also failed: %s", minimal_error)
+            raise SearchFailedError(minimal_error, search_error)
+
+# Answer caches, kept for as long as the function instance stays warm (see
+# app.py). The semantic cache needs an Azure OpenAI embedding deployment here,
+# since loading a local sentence-transformers model would slow cold starts.
+EXACT_CACHE_MAX_ENTRIES = 1024
+EXACT_CACHE_TTL = int(os.getenv("EXACT_CACHE_TTL", "3600"))  # seconds
+EXACT_CACHE = ExactCache(max_entries=EXACT_CACHE_MAX_ENTRIES, ttl=EXACT_CACHE_TTL)
+
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+SEMANTIC_CACHE_EMBEDDING_DEPLOYMENT = os.getenv("SEMANTIC_CACHE_EMBEDDING_DEPLOYMENT")
+SEMANTIC_CACHE_EMBEDDING_DIM = int(os.getenv("SEMANTIC_CACHE_EMBEDDING_DIM", "1536"))
+
+semantic_cache = None
+if SEMANTIC_CACHE_ENABLED and SEMANTIC_CACHE_EMBEDDING_DEPLOYMENT:
+    semantic_cache = GroundedCache(
+        dim=SEMANTIC_CACHE_EMBEDDING_DIM,
+        threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95")),
+        ttl=int(os.getenv("SEMANTIC_CACHE_TTL", "86400")),
+        max_entries=int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "10000")),
+        ann_min_entries=int(os.getenv("SEMANTIC_CACHE_ANN_MIN_ENTRIES", "2000")),
+        min_jaccard=float(os.getenv("SEMANTIC_CACHE_MIN_JACCARD", "0.7")),
+        min_coverage=float(os.getenv("SEMANTIC_CACHE_MIN_COVERAGE", "0.7"))
+    )
+    logger.info("Semantic cache enabled (%s)", SEMANTIC_CACHE_EMBEDDING_DEPLOYMENT)
+
+embedding_dim_checked = False
+
+def embedding_fits_cache(vector):
+    """Check the first embedding against the semantic cache size, disabling the cache on a mismatch"""
+    global semantic_cache, embedding_dim_checked
+    if not embedding_dim_checked:
+        embedding_dim_checked = True
+        if vector.shape[-1] != semantic_cache.dim:
+            logger.error(
+                "Embeddings have %d dimensions but the semantic cache expects %d "
+                "(check SEMANTIC_CACHE_EMBEDDING_DIM); semantic cache disabled",
+                vector.shape[-1], semantic_cache.dim
+            )
+            semantic_cache = None
+    return semantic_cache is not None
+
+async def semantic_lookup(query, scope):
+    """Embed the query and return (vector, closest cached entry or None).
+
+    The cache is best-effort: if embedding or the lookup fails, the request
+    carries on as a miss with (None, None).
+    """
+    try:
+        query_vector = np.asarray(await EMBEDDING_BATCHER.embed(normalize_query(query)), dtype=np.float32)
+        if not embedding_fits_cache(query_vector):
+            return None, None
+        query_vector /= np.linalg.norm(query_vector)
+        return query_vector, semantic_cache.lookup(query_vector, scope)
+    except Exception as e:
+        logger.warning("Semantic cache lookup failed, treating as a miss: %s", e)
+        return None, None
+
+def cache_semantic_answer(query_vector, answer, chunk_versions, scope):
+    """Add a generated answer to the semantic cache; a failed write is only logged"""
+    try:
+        semantic_cache.add_answer(query_vector, answer, chunk_versions, scope)
+    except Exception as e:
+        logger.warning("Semantic cache write failed: %s", e)
+
+# Browser/proxy cache lifetimes (seconds) for GET endpoints that rarely change
+HEALTH_MAX_AGE = 10
+DEBUG_FIELDS_MAX_AGE = 300
+
+# Facet values only change when the index is updated, so /filters is cached
+# for as long as the function instance stays warm
+FILTERS_TTL = int(os.getenv("FILTERS_TTL", "300"))  # seconds
+_FILTERS_CACHE = {"ts": 0, "payload": None, "body": None, "etag": None}
+_FILTERS_LOCK = asyncio.Lock()
+
+def cache_filter_options(payload):
+    """Store the /filters payload along with its serialized body and ETag for cache hits"""
+    _FILTERS_CACHE["payload"] = payload
+    _FILTERS_CACHE["body"] = orjson.dumps(payload)
+    _FILTERS_CACHE["etag"] = '"' + hashlib.blake2b(_FILTERS_CACHE["body"], digest_size=16).hexdigest() + '"'
+    _FILTERS_CACHE["ts"] = time.time()
+
+def cached_filters_response(req):
+    """Serve the cached /filters body, or a bodiless 304 if the client's copy is current"""
+    # no-cache makes browsers revalidate with If-None-Match instead of reusing blindly
+    headers = {"Cache-Control": "no-cache", "ETag": _FILTERS_CACHE["etag"]}
+    client_etags = [tag.strip() for tag in req.headers.get("If-None-Match", "").split(",")]
+    if _FILTERS_CACHE["etag"] in client_etags:
+        return func.HttpResponse(status_code=304, headers=headers)
+    return func.HttpResponse(
+        _FILTERS_CACHE["body"],
+        status_code=200,
+        headers=headers,
+        mimetype="application/json"
+    )
 
 # FUNCTION 1: Health Check
 @app.route(route="health", methods=["GET"])
-def health_check(req: func.HttpRequest) -> func.HttpResponse:
+async def health_check(req: func.HttpRequest) -> func.HttpResponse:
     """Health check endpoint to verify service status"""
-    
+    await ensure_azure_clients()
+
+    if openai_client and search_client and not missing_vars:
+        # Status only changes on restart, so let probes and proxies reuse it briefly
+        return func.HttpResponse(
+            HEALTHY_BODY,
+            status_code=200,
+            headers={"Cache-Control": f"public, max-age={HEALTH_MAX_AGE}"},
+            mimetype="application/json"
+        )
+
     status = {
-        "status": "healthy",
+        "status": "unhealthy",
         "services": {
             "openai": openai_client is not None,
             "search": search_client is not None
         },
-        "missing_env_vars": missing_vars if missing_vars else []
+        "missing_env_vars": missing_vars
     }
-    
-    if missing_vars or not openai_client or not search_client:
-        status["status"] = "unhealthy"
-        return func.HttpResponse(
-            json.dumps(status),
-            status_code=503,
-            mimetype="application/json"
-        )
-    
     return func.HttpResponse(
-        json.dumps(status),
-        status_code=200,
+        orjson.dumps(status),
+        status_code=503,
         mimetype="application/json"
     )
 
 # FUNCTION 2: Chat Endpoint
 @app.route(route="chat", methods=["POST"])
-def chat(req: func.HttpRequest) -> func.HttpResponse:
+async def chat(req: func.HttpRequest) -> func.HttpResponse:
     """Chat endpoint with Azure OpenAI and Search"""
-    
+    await ensure_azure_clients()
+
     try:
         # Check if Azure clients are available
         if not openai_client or not search_client:
             return func.HttpResponse(
-                json.dumps({
-                    "error": "Azure services not available. Please check environment variables.",
-                    "missing_vars": missing_vars
-                }),
+                SERVICES_UNAVAILABLE_BODY,
                 status_code=503,
                 mimetype="application/json"
             )
 
         # Get request data
         try:
-            req_body = req.get_json()
+            req_body = orjson.loads(req.get_body())
         except ValueError:
+            req_body = None
+        if not req_body or not isinstance(req_body, dict):
             return func.HttpResponse(
-                json.dumps({"error": "No JSON data provided"}),
+                orjson.dumps({"error": "No JSON data provided"}),
                 status_code=400,
                 mimetype="application/json"
             )
-            
+
+        # Oversized queries are rejected before they reach Azure
         query = req_body.get("query")
-        if not query:
+        filters = req_body.get("filters", {})
+        input_error = chat_input_error(query, filters)
+        if input_error:
             return func.HttpResponse(
-                json.dumps({"error": "Query parameter is required"}),
+                orjson.dumps({"error": input_error}),
                 status_code=400,
                 mimetype="application/json"
             )
-            
-        filters = req_body.get("filters", {})
 
-        logging.info(f"Processing query: {query}")
+        logger.info("Processing query: %s", query)
         if filters:
-            logging.info(f"Applied filters: {filters}")
-
-        # Map frontend filter names to Azure AI Search field names
-        field_mapping = {
-            'authors': 'author',
-            'file_type': 'documentType',
-            'file_types': 'data_product_type',
-            'content_type': 'documentType',
-            'extension': 'extension',
-            'language': 'language',
-            'topic': 'topic',
-            'business_unit': 'owner_business_unit',
-            'owner_business': 'owner_business',
-            'user_group': 'user_group'
-        }
+            logger.info("Applied filters: %s", filters)
+
+        # Serve repeated (query, filters) pairs straight from the exact cache
+        cache_key = exact_cache_key(query, filters, AZURE_DEPLOYMENT_NAME)
+        cached_payload = EXACT_CACHE.get(cache_key)
+        if cached_payload is not None:
+            logger.debug("Exact cache hit")
+            return func.HttpResponse(orjson.dumps(cached_payload), status_code=200, mimetype="application/json")
 
         # Build filter string
-        filter_conditions = []
-        for key, value in filters.items():
-            if value and str(value).strip():
-                azure_field = field_mapping.get(key, key)
-                filter_conditions.append(f"{azure_field} eq '{value}'")
-        filter_string = ' and '.join(filter_conditions) if filter_conditions else None
-        
-        logging.info(f"Filter string: {filter_string}")
+        filter_string = build_filter_string(filters)
+        logger.debug("Filter string: %s", filter_string)
 
-        # Search Azure AI Search
-        try:
-            search_args = {
-                "search_text": query,
-                "select": [
-                    "parent_id", "title", "chunk_id", "chunk", "documentType", "author",
-                    "Documentid", "document_title", "language", "topic", "summary", "keywords",
-                    "element", "entities", "user_group", "extension", "data_product_id",
-                    "data_product_name", "data_product_type", "data_product_description",
-                    "owner_business_unit", "owner_business", "owner_technical", "owner_group",
-                    "storage_location", "version", "creation_date", "update_date"
-                ],
-                "top": 5
-            }
-            if filter_string:
-                search_args["filter"] = filter_string
+        # Embed the query for the semantic cache while the search is in flight;
+        # a candidate is only served once validated against the fresh results
+        cache_scope = filters_scope(filters, AZURE_DEPLOYMENT_NAME)
+        pending = [search_documents(query, filter_string)]
+        if semantic_cache:
+            pending.append(semantic_lookup(query, cache_scope))
 
-            results = search_client.search(**search_args)
-            logging.info("Search successful")
-            
-        except Exception as search_error:
-            logging.error(f"Search failed: {str(search_error)}")
-            # Try with minimal fields
-            try:
-                logging.info("Trying search with minimal fields...")
-                minimal_search_args = {
-                    "search_text": query,
-                    "top": 5
-                }
-                if filter_string:
-                    minimal_search_args["filter"] = filter_string
-                
-                results = search_client.search(**minimal_search_args)
-                logging.info("Minimal field search successful")
-                
-            except Exception as minimal_error:
-                logging.error(f"Minimal search also failed: {str(minimal_error)}")
-                return func.HttpResponse(
-                    json.dumps({
-                        "error": f"Search failed: {str(minimal_error)}",
-                        "original_error": str(search_error),
-                        "filter_applied": filter_string
-                    }),
-                    status_code=500,
-                    mimetype="application/json"
-                )
+        try:
+            results, *semantic_lookups = await asyncio.gather(*pending)
+        except SearchFailedError as search_error:
+            return func.HttpResponse(
+                orjson.dumps({
+                    "error": f"Search failed: {str(search_error)}",
+                    "original_error": str(search_error.original_error),
+                    "filter_applied": filter_string
+                }),
+                status_code=500,
+                mimetype="application/json"
+            )
+        query_vector, semantic_candidate = semantic_lookups[0] if semantic_lookups else (None, None)
 
         # Process results
         try:
-            logging.info("Processing search results...")
-            retrieved_context = ""
-            sources = []
-            result_count = 0
-
-            for result in results:
-                logging.info(f"Processing result: {list(dict(result).keys())}")
-                
-                # Use 'chunk' field for content, fallback to other possible field names
-                chunk = result.get('chunk', result.get('content', result.get('text', '')))
-                if not chunk:
-                    # Try to get any text-like field if chunk is empty
-                    chunk = result.get('summary', result.get('title', ''))
-                
-                retrieved_context += chunk + "\n"
-                sources.append({
-                    'title': result.get('title', result.get('document_title', 'N/A')),
-                    'author': result.get('author', 'N/A'),
-                    'document_title': result.get('document_title', result.get('title', 'N/A')),
-                    'document_type': result.get('documentType', 'N/A'),
-                    'language': result.get('language', 'N/A'),
-                    'topic': result.get('topic', 'N/A'),
-                    'data_product_type': result.get('data_product_type', 'N/A'),
-                    'owner_business': result.get('owner_business', 'N/A'),
-                    'user_group': result.get('user_group', 'N/A'),
-                    'extension': result.get('extension', 'N/A'),
-                    'document_id': result.get('Documentid', result.get('parent_id', 'N/A')),
-                    'chunk_id': result.get('chunk_id', 'N/A'),
-                    'creation_date': str(result.get('creation_date', 'N/A')),
-                    'update_date': str(result.get('update_date', 'N/A'))
-                })
-                result_count += 1
-
-            logging.info(f"Processed {result_count} results")
-            logging.info(f"Retrieved context length: {len(retrieved_context)}")
+            logger.debug("Processing search results...")
+            retrieved_context, sources, chunk_versions = process_results(results)
+            result_count = len(sources)
+            logger.debug("Processed %d results", result_count)
+            logger.debug("Retrieved context length: %d", len(retrieved_context))
 
             if not retrieved_context.strip():
-                logging.warning("No relevant documents found")
+                logger.warning("No relevant documents found")
                 return func.HttpResponse(
-                    json.dumps({
-                        "answer": "I couldn't find any relevant information in the documents with the applied filters. Please try adjusting your query or filters.",
+                    orjson.dumps({
+                        "answer": NO_RESULTS_ANSWER,
                         "sources": [],
                         "result_count": 0
                     }),
@@ -246,52 +467,46 @@ def chat(req: func.HttpRequest) -> func.HttpResponse:
                 )
 
         except Exception as process_error:
-            logging.error(f"Error processing results: {str(process_error)}")
+            logger.error("Error processing results: %s", process_error)
             return func.HttpResponse(
-                json.dumps({
+                orjson.dumps({
                     "error": f"Error processing search results: {str(process_error)}"
                 }),
                 status_code=500,
                 mimetype="application/json"
             )
 
+        # Serve the semantic cache candidate if the evidence still supports it
+        if semantic_candidate is not None:
+            failed_gate = semantic_cache.validate(semantic_candidate, chunk_versions, retrieved_context)
+            if failed_gate is None:
+                logger.debug("Semantic cache hit")
+                payload = {
+                    "answer": semantic_candidate["answer"],
+                    "sources": sources,
+                    "result_count": result_count,
+                    "filters_applied": filter_string
+                }
+                EXACT_CACHE.set(cache_key, payload)
+                return func.HttpResponse(orjson.dumps(payload), status_code=200, mimetype="application/json")
+            logger.debug("Semantic cache candidate rejected by gate %s", failed_gate)
+
         # Generate response with OpenAI
         try:
-            logging.info("Generating OpenAI response...")
-            system_prompt = (
-                "You are a helpful AI assistant. Answer the user's question based ONLY on the context "
-                "provided below. If the answer is not in the context, say 'I don't have enough information "
-                "in the provided documents to answer that.' Do not make up information. Provide clear, concise answers."
-            )
-            augmented_prompt = f"CONTEXT FROM DOCUMENTS:\n{retrieved_context}\n\nQUESTION:\n{query}"
-
-            response = openai_client.chat.completions.create(
+            logger.debug("Generating OpenAI response...")
+            response = await create_completion(
                 model=AZURE_DEPLOYMENT_NAME,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": augmented_prompt}
-                ],
+                messages=build_messages(retrieved_context, query),
                 temperature=0.2
             )
 
             answer = response.choices[0].message.content
-            logging.info(f"Generated response for query: {query}")
-            
-            return func.HttpResponse(
-                json.dumps({
-                    "answer": answer,
-                    "sources": sources,
-                    "result_count": result_count,
-                    "filters_applied": filter_string
-                }),
-                status_code=200,
-                mimetype="application/json"
-            )
-            
+            logger.info("Generated response for query: %s", query)
+
         except Exception as openai_error:
-            logging.error(f"OpenAI error: {str(openai_error)}")
+            logger.error("OpenAI error: %s", openai_error)
             return func.HttpResponse(
-                json.dumps({
+                orjson.dumps({
                     "error": f"Error generating response: {str(openai_error)}",
                     "sources": sources,
                     "result_count": result_count
@@ -299,13 +514,29 @@ def chat(req: func.HttpRequest) -> func.HttpResponse:
                 status_code=500,
                 mimetype="application/json"
             )
-        
+
+        payload = {
+            "answer": answer,
+            "sources": sources,
+            "result_count": result_count,
+            "filters_applied": filter_string
+        }
+        # An empty answer (e.g. content-filtered) would be served to later queries
+        if answer and answer.strip():
+            EXACT_CACHE.set(cache_key, payload)
+            if query_vector is not None:
+                cache_semantic_answer(query_vector, answer, chunk_versions, cache_scope)
+
+        return func.HttpResponse(
+            orjson.dumps(payload),
+            status_code=200,
+            mimetype="application/json"
+        )
+
     except Exception as e:
-        logging.error(f"Unexpected error in chat endpoint: {str(e)}")
-        import traceback
-        logging.error(f"Traceback: {traceback.format_exc()}")
+        logger.exception("Unexpected error in chat endpoint: %s", e)
         return func.HttpResponse(
-            json.dumps({
+            orjson.dumps({
                 "error": f"Failed to process chat request: {str(e)}"
             }),
             status_code=500,
@@ -314,100 +545,70 @@ def chat(req: func.HttpRequest) -> func.HttpResponse:
 
 # FUNCTION 3: Filters Endpoint
 @app.route(route="filters", methods=["GET"])
-def get_filter_options(req: func.HttpRequest) -> func.HttpResponse:
+async def get_filter_options(req: func.HttpRequest) -> func.HttpResponse:
     """Get available filter options from the search index"""
-    
+    await ensure_azure_clients()
+
     try:
         # Check if Azure search client is available
         if not search_client:
-            logging.warning("Search client not available for filters endpoint")
+            logger.warning("Search client not available for filters endpoint")
             return func.HttpResponse(
-                json.dumps({
-                    "authors": ["Sample Author 1", "Sample Author 2"],
-                    "file_types": ["pdf", "docx", "txt"],
-                    "note": "Mock data - Azure Search not configured"
-                }),
+                MOCK_FILTERS_BODY,
                 status_code=200,
                 mimetype="application/json"
             )
 
-        logging.info("Fetching filter options from Azure Search...")
+        if _FILTERS_CACHE["payload"] and time.time() - _FILTERS_CACHE["ts"] < FILTERS_TTL:
+            return cached_filters_response(req)
+
+        # Concurrent invocations on a cold or expired cache share one facet query
+        async with _FILTERS_LOCK:
+            if _FILTERS_CACHE["payload"] and time.time() - _FILTERS_CACHE["ts"] < FILTERS_TTL:
+                return cached_filters_response(req)
+
+            logger.debug("Fetching filter options from Azure Search...")
         
-        # Use actual field names from the index
-        filter_options = {
-            'author': [],
-            'documentType': [],
-            'language': [],
-            'topic': [],
-            'data_product_type': [],
-            'owner_business_unit': [],
-            'owner_business': [],
-            'user_group': [],
-            'extension': []
-        }
+            # Use actual field names from the index
+            filter_options = {
+                'author': [],
+                'documentType': [],
+                'language': [],
+                'topic': [],
+                'data_product_type': [],
+                'owner_business_unit': [],
+                'owner_business': [],
+                'user_group': [],
+                'extension': []
+            }
 
-        try:
-            for field in filter_options.keys():
-                search_results = search_client.search(
+            try:
+                # One faceted query returns every field's values in a single round trip
+                facets_by_field = await fetch_facets(
                     search_text="*",
-                    facets=[field],
+                    facets=[f"{field},count:{FACET_VALUE_LIMIT}" for field in filter_options],
                     top=0
                 )
-                if hasattr(search_results, 'get_facets') and search_results.get_facets():
-                    facets = search_results.get_facets().get(field, [])
+                for field in filter_options:
+                    facets = facets_by_field.get(field, [])
                     filter_options[field] = [facet['value'] for facet in facets if facet['count'] > 0]
 
-            logging.info(f"Found filter options: {len(filter_options)} categories")
-            
-            # Convert to frontend's expected format
-            return func.HttpResponse(
-                json.dumps({
-                    "authors": filter_options.get('author', []),
-                    "file_types": filter_options.get('documentType', []) + filter_options.get('data_product_type', []),
-                    "document_types": filter_options.get('documentType', []),
-                    "languages": filter_options.get('language', []),
-                    "topics": filter_options.get('topic', []),
-                    "business_units": filter_options.get('owner_business_unit', []),
-                    "owner_business": filter_options.get('owner_business', []),
-                    "user_groups": filter_options.get('user_group', []),
-                    "extensions": filter_options.get('extension', []),
-                    "data_product_types": filter_options.get('data_product_type', [])
-                }),
-                status_code=200,
-                mimetype="application/json"
-            )
+                logger.debug("Found filter options: %d categories", len(filter_options))
             
-        except Exception as facet_error:
-            logging.warning(f"Faceted search failed, using basic search: {facet_error}")
-            # Fallback to basic search if facets fail
-            authors = set()
-            topics = set()
-            languages = set()
+                # Convert to frontend's expected format
+                cache_filter_options(format_filter_options(filter_options))
+                return cached_filters_response(req)
             
-            results = search_client.search("*", top=100)
-            for doc in results:
-                if doc.get("author"):
-                    authors.add(doc.get("author"))
-                if doc.get("topic"):
-                    topics.add(doc.get("topic"))
-                if doc.get("language"):
-                    languages.add(doc.get("language"))
-            
-            return func.HttpResponse(
-                json.dumps({
-                    "authors": sorted(list(authors)),
-                    "topics": sorted(list(topics)),
-                    "languages": sorted(list(languages)),
-                    "file_types": ["pdf", "docx", "txt"]
-                }),
-                status_code=200,
-                mimetype="application/json"
-            )
-        
+            except Exception as facet_error:
+                logger.warning("Faceted search failed, using basic search: %s", facet_error)
+                # Fallback to basic search if facets fail
+                cache_filter_options(await collect_fallback_filter_options(search_client))
+                return cached_filters_response(req)
+
     except Exception as e:
-        logging.error(f"Error in filters endpoint: {str(e)}")
+        logger.error("Error in filters endpoint: %s", e)
         return func.HttpResponse(
-            json.dumps({
+            orjson.dumps({
                 "authors": ["Sample Author"],
                 "file_types": ["pdf", "docx"],
                 "error": f"Failed to fetch from Azure Search: {str(e)}",
@@ -419,31 +620,32 @@ def get_filter_options(req: func.HttpRequest) -> func.HttpResponse:
 
 # FUNCTION 4: Debug Fields Endpoint
 @app.route(route="debug/fields", methods=["GET"])
-def debug_fields(req: func.HttpRequest) -> func.HttpResponse:
+async def debug_fields(req: func.HttpRequest) -> func.HttpResponse:
     """Debug endpoint to discover available fields in the search index"""
-    
+    await ensure_azure_clients()
+
     try:
         if not search_client:
             return func.HttpResponse(
-                json.dumps({"error": "Search client not available"}),
+                orjson.dumps({"error": "Search client not available"}),
                 status_code=503,
                 mimetype="application/json"
             )
         
         # Get a sample document to see what fields are available
-        results = search_client.search("*", top=1)
+        results = await search_client.search("*", top=1)
         
         sample_doc = None
         available_fields = []
         
-        for result in results:
+        async for result in results:
             sample_doc = dict(result)
             available_fields = list(sample_doc.keys())
             break
         
         if not sample_doc:
             return func.HttpResponse(
-                json.dumps({
+                orjson.dumps({
                     "message": "No documents found in index",
                     "available_fields": [],
                     "sample_document": None
@@ -453,21 +655,37 @@ def debug_fields(req: func.HttpRequest) -> func.HttpResponse:
             )
         
         return func.HttpResponse(
-            json.dumps({
+            orjson.dumps({
                 "message": "Available fields in your Azure AI Search index",
                 "available_fields": sorted(available_fields),
-                "sample_document": sample_doc,
+                "sample_document": trim_sample_document(sample_doc),
                 "field_count": len(available_fields)
             }),
             status_code=200,
+            headers={"Cache-Control": f"max-age={DEBUG_FIELDS_MAX_AGE}"},
             mimetype="application/json"
         )
         
     except Exception as e:
         return func.HttpResponse(
-            json.dumps({
+            orjson.dumps({
                 "error": f"Failed to fetch field information: {str(e)}"
             }),
             status_code=500,
             mimetype="application/json"
         )
+
+# FUNCTION 5: Cache Invalidation Endpoint
+@app.route(route="cache/invalidate", methods=["POST"])
+async def invalidate_chat_cache(req: func.HttpRequest) -> func.HttpResponse:
+    """Drop cached /chat answers, e.g. after the search index has been updated"""
+    # Caches are per warm instance, so each instance has to be invalidated
+    EXACT_CACHE.clear()
+    SEARCH_CACHE.clear()
+    if semantic_cache:
+        semantic_cache.clear()
+    return func.HttpResponse(
+        orjson.dumps({"message": "Chat cache cleared"}),
+        status_code=200,
+        mimetype="application/json"
+    )
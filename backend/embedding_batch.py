@@ -0,0 +1,66 @@
+# Micro-batching for Azure OpenAI embeddings, shared by the Quart app (app.py)
+# and the Azure Functions app (deppy.py). Queries arriving within a short
+# window are embedded with one embeddings.create(input=[...]) call instead of
+# one round trip each.
+import asyncio
+import os
+
+# How long the first query of a batch waits for others to join it
+EMBED_BATCH_WINDOW_MS = int(os.getenv("EMBED_BATCH_WINDOW_MS", "20"))
+# Azure OpenAI accepts up to 2048 inputs per request
+EMBED_BATCH_MAX_SIZE = int(os.getenv("EMBED_BATCH_MAX_SIZE", "64"))
+
+class EmbeddingBatcher:
+    """Collects concurrent embed() calls into batched embedding requests.
+
+    embed_many is an async callable taking a list of texts and returning the
+    embeddings in the same order. A batch is sent when the window closes or
+    the batch is full, whichever comes first.
+    """
+
+    def __init__(self, embed_many, window_ms=EMBED_BATCH_WINDOW_MS, max_size=EMBED_BATCH_MAX_SIZE):
+        self.embed_many = embed_many
+        self.window = window_ms / 1000
+        self.max_size = max_size
+        self._pending = {}  # text -> future, so duplicates in a batch share one input
+        self._timer = None
+        self._sending = set()  # strong references so in-flight batches aren't garbage collected
+
+    async def embed(self, text):
+        """Embed one text as part of the next batch"""
+        if not text.strip():
+            # The service rejects empty input, which would fail the whole batch
+            raise ValueError("Cannot embed empty text")
+        future = self._pending.get(text)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._pending[text] = future
+            if len(self._pending) >= self.max_size:
+                self._flush()
+            elif self._timer is None:
+                self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+        # Shielded so one caller being cancelled doesn't fail the others sharing the text
+        return await asyncio.shield(future)
+
+    def _flush(self):
+        """Send the pending texts as one request"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, {}
+        if batch:
+            task = asyncio.create_task(self._send(batch))
+            self._sending.add(task)
+            task.add_done_callback(self._sending.discard)
+
+    async def _send(self, batch):
+        try:
+            embeddings = await self.embed_many(list(batch))
+        except Exception as e:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for future, embedding in zip(batch.values(), embeddings):
+            if not future.done():
+                future.set_result(embedding)
@@ -0,0 +1,77 @@
+# OData filter expressions for the frontend's filter selections, shared by the
+# Quart app (app.py) and the Azure Functions app (deppy.py)
+import logging
+from functools import lru_cache
+from types import MappingProxyType
+
+logger = logging.getLogger(__name__)
+
+# Map frontend filter names to Azure AI Search field names
+FIELD_MAPPING = MappingProxyType({
+    'authors': 'author',
+    'file_type': 'documentType',
+    'file_types': 'data_product_type',
+    'content_type': 'documentType',
+    'extension': 'extension',
+    'language': 'language',
+    'topic': 'topic',
+    'business_unit': 'owner_business_unit',
+    'owner_business': 'owner_business',
+    'user_group': 'user_group'
+})
+
+# Azure field names may also be used directly as filter keys
+FILTERABLE_FIELDS = frozenset(FIELD_MAPPING.values())
+
+# OData string literals escape a single quote by doubling it
+_ODATA_ESCAPE = str.maketrans({"'": "''"})
+
+def canonical_filters(filters):
+    """Sort multi-select values so the same selections in any order share cache entries"""
+    return {
+        key: sorted(value, key=str) if isinstance(value, list) else value
+        for key, value in filters.items()
+    }
+
+@lru_cache(maxsize=1024)
+def _build_filter_string(items):
+    filter_conditions = []
+    for key, value in items:
+        # Only whitelisted fields are interpolated into the OData expression
+        azure_field = FIELD_MAPPING.get(key) or (key if key in FILTERABLE_FIELDS else None)
+        if not azure_field:
+            logger.warning("Ignoring unknown filter field: %s", key)
+            continue
+
+        if isinstance(value, tuple):
+            # Multi-select values become a single search.in() clause. '|' is the
+            # delimiter because values such as author names can contain commas.
+            values = [str(v).translate(_ODATA_ESCAPE) for v in value if v and str(v).strip()]
+            if any('|' in v for v in values):
+                # A value containing the delimiter would be split, so spell it out
+                filter_conditions.append('(' + ' or '.join(f"{azure_field} eq '{v}'" for v in values) + ')')
+            elif values:
+                filter_conditions.append(f"search.in({azure_field}, '{'|'.join(values)}', '|')")
+        elif value and str(value).strip():
+            filter_conditions.append(f"{azure_field} eq '{str(value).translate(_ODATA_ESCAPE)}'")
+    return ' and '.join(filter_conditions) if filter_conditions else None
+
+def build_filter_string(filters):
+    """Build the OData filter expression for the frontend's filter selections.
+
+    Expressions are cached by filter set, since UI-driven requests repeat the
+    same few selections.
+    """
+    # Most requests carry no selections at all
+    if not any(filters.values()):
+        return None
+
+    items = tuple(sorted(
+        (key, tuple(value) if isinstance(value, list) else value)
+        for key, value in canonical_filters(filters).items()
+    ))
+    try:
+        return _build_filter_string(items)
+    except TypeError:
+        # Unhashable values (e.g. nested objects) can't be cached
+        return _build_filter_string.__wrapped__(items)
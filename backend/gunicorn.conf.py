@@ -0,0 +1,33 @@
+# Gunicorn settings for serving the Quart backend in production:
+#   cd backend && gunicorn -c gunicorn.conf.py app:app
+#
+# Each uvicorn worker runs one asyncio event loop, so the HTTPS calls to
+# Azure Search and Azure OpenAI from many concurrent requests overlap
+# instead of holding a worker for the whole round trip.
+import multiprocessing
+import os
+
+from uvicorn.workers import UvicornWorker
+
+class UvloopWorker(UvicornWorker):
+    """Uvicorn worker pinned to uvloop and httptools (installed by uvicorn[standard])
+
+    The stock worker silently falls back to the slower asyncio loop and h11
+    parser when they are missing; this one fails at startup instead.
+    """
+    CONFIG_KWARGS = {**UvicornWorker.CONFIG_KWARGS, "loop": "uvloop", "http": "httptools"}
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+# One async worker per core: each already overlaps many requests on its event
+# loop, and every extra worker loads its own embedding model and splits the
+# caches, rate limits and /filters refresher (the 2 x cores + 1 rule is for
+# sync workers)
+workers = int(os.getenv("GUNICORN_WORKERS", str(multiprocessing.cpu_count())))
+worker_class = UvloopWorker
+timeout = 120
+# Give in-flight requests (long streamed answers included) as long to finish
+# on a restart or deploy as they would have had to complete normally
+graceful_timeout = timeout
+# Outlive the 60 s idle timeout of typical load balancers so they never reuse
+# a connection the worker has just closed
+keepalive = 75
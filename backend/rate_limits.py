@@ -0,0 +1,37 @@
+# Client-side rate limits for Azure OpenAI and Azure Search, shared by the
+# Quart app (app.py) and the Azure Functions app (deppy.py). Bursts queue here
+# instead of overrunning the deployment quota and ending in 429 retry storms.
+# Limits are per process: divide the quota by the number of workers.
+import os
+
+from aiolimiter import AsyncLimiter
+
+# Rough prompt size estimate; Azure's own accounting is close to 4 characters a token
+CHARS_PER_TOKEN = 4
+
+def _per_minute_limiter(env_var):
+    """Limiter allowing the env var's value per minute, or None when it is unset"""
+    rate = int(os.getenv(env_var, "0"))
+    return AsyncLimiter(rate, 60) if rate > 0 else None
+
+OPENAI_REQUEST_LIMITER = _per_minute_limiter("AZURE_OPENAI_RPM")
+OPENAI_TOKEN_LIMITER = _per_minute_limiter("AZURE_OPENAI_TPM")
+SEARCH_REQUEST_LIMITER = _per_minute_limiter("AZURE_SEARCH_RPM")
+
+def estimate_prompt_tokens(messages):
+    """Approximate the prompt tokens of a list of chat messages"""
+    return sum(len(message["content"]) for message in messages) // CHARS_PER_TOKEN + 1
+
+async def wait_for_openai_quota(messages):
+    """Wait until a chat completion over these messages fits the RPM and TPM limits"""
+    if OPENAI_REQUEST_LIMITER:
+        await OPENAI_REQUEST_LIMITER.acquire()
+    if OPENAI_TOKEN_LIMITER:
+        # A prompt larger than the whole budget still goes through once the bucket is full
+        tokens = min(estimate_prompt_tokens(messages), OPENAI_TOKEN_LIMITER.max_rate)
+        await OPENAI_TOKEN_LIMITER.acquire(tokens)
+
+async def wait_for_search_quota():
+    """Wait until another Azure Search query fits the RPM limit"""
+    if SEARCH_REQUEST_LIMITER:
+        await SEARCH_REQUEST_LIMITER.acquire()
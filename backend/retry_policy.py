@@ -0,0 +1,61 @@
+# Retry policy for Azure Search and Azure OpenAI calls, shared by the Quart
+# app (app.py) and the Azure Functions app (deppy.py). This is the only retry
+# layer: the SDK clients are built with their own retries turned off
+# (max_retries=0 / retry_total=0) so one call never fans out into a storm of
+# nested attempts.
+import os
+
+from azure.core.exceptions import HttpResponseError, ServiceRequestError, ServiceResponseError
+from openai import APIConnectionError, APIStatusError
+from tenacity import retry, retry_if_exception, wait_exponential_jitter
+
+# Retry timeouts, throttling (429) and transient server errors, plus requests
+# that never got a response, as the SDKs' own policies did
+RETRYABLE_STATUS_CODES = (408, 429, 500, 502, 503, 504)
+RETRYABLE_CONNECTION_ERRORS = (APIConnectionError, ServiceRequestError, ServiceResponseError)
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "5"))
+RETRY_MAX_WAIT = 8  # seconds
+
+def is_retryable_error(error):
+    """True for Azure Search and Azure OpenAI errors worth retrying"""
+    if isinstance(error, RETRYABLE_CONNECTION_ERRORS):
+        return True
+    return (
+        isinstance(error, (HttpResponseError, APIStatusError))
+        and getattr(error, "status_code", None) in RETRYABLE_STATUS_CODES
+    )
+
+def retry_after_seconds(error):
+    """Seconds the server asked us to wait before retrying, or None if it didn't say"""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        # Azure OpenAI sends a millisecond-precision variant alongside Retry-After
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        return float(headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+def stop_retrying(retry_state):
+    """Stop after RETRY_MAX_ATTEMPTS, or at once if the server asks for a longer wait than RETRY_MAX_WAIT"""
+    if retry_state.attempt_number >= RETRY_MAX_ATTEMPTS:
+        return True
+    retry_after = retry_after_seconds(retry_state.outcome.exception())
+    return retry_after is not None and retry_after > RETRY_MAX_WAIT
+
+_backoff = wait_exponential_jitter(initial=0.5, max=RETRY_MAX_WAIT)
+
+def wait_for_retry(retry_state):
+    """Wait as long as the server's Retry-After asks, else back off exponentially with jitter"""
+    retry_after = retry_after_seconds(retry_state.outcome.exception())
+    return retry_after if retry_after is not None else _backoff(retry_state)
+
+azure_retry = retry(
+    retry=retry_if_exception(is_retryable_error),
+    stop=stop_retrying,
+    wait=wait_for_retry,
+    reraise=True
+)
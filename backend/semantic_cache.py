@@ -0,0 +1,233 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+try:
+    import hnswlib
+except ImportError:  # Optional: without it every bucket uses the exact numpy scan
+    hnswlib = None
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+# HNSW graph parameters: M links per node, and the candidate list sizes used
+# while building the graph and while searching it
+HNSW_M = 16
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF = 64
+
+
+class _FlatIndex:
+    """Exact nearest-neighbour search over a numpy matrix of vectors"""
+
+    def __init__(self, dim):
+        self.vectors = np.empty((0, dim), dtype=np.float32)
+        self.labels = []
+
+    def add(self, vector, label):
+        self.vectors = np.vstack([self.vectors, vector])
+        self.labels.append(label)
+
+    def remove(self, labels):
+        keep = [i for i, label in enumerate(self.labels) if label not in labels]
+        self.vectors = self.vectors[keep]
+        self.labels = [self.labels[i] for i in keep]
+
+    def nearest(self, vector):
+        """Return (label, similarity) of the closest stored vector"""
+        sims = self.vectors @ vector
+        idx = int(sims.argmax())
+        return self.labels[idx], float(sims[idx])
+
+
+class _HNSWIndex:
+    """Approximate nearest-neighbour search over an hnswlib graph"""
+
+    def __init__(self, dim, max_elements):
+        self.index = hnswlib.Index(space="ip", dim=dim)
+        self.index.init_index(
+            max_elements=max_elements,
+            ef_construction=HNSW_EF_CONSTRUCTION,
+            M=HNSW_M,
+            allow_replace_deleted=True
+        )
+        self.index.set_ef(HNSW_EF)
+
+    @classmethod
+    def from_flat(cls, flat, max_elements):
+        ann = cls(flat.vectors.shape[1], max_elements)
+        if flat.labels:
+            ann.index.add_items(flat.vectors, flat.labels)
+        return ann
+
+    def add(self, vector, label):
+        self.index.add_items(vector, [label], replace_deleted=True)
+
+    def remove(self, labels):
+        for label in labels:
+            self.index.mark_deleted(label)
+
+    def nearest(self, vector):
+        """Return (label, similarity) of the closest stored vector"""
+        labels, distances = self.index.knn_query(vector, k=1)
+        # hnswlib's inner-product distance is 1 - dot product
+        return int(labels[0][0]), 1.0 - float(distances[0][0])
+
+
+class SemanticCache:
+    """In-process cache of chat payloads looked up by query-embedding similarity.
+
+    Vectors are expected to be L2-normalized so a dot product is the cosine
+    similarity. Entries are bucketed by scope (e.g. a hash of the applied
+    filters) so an answer is only reused for requests with the same filters.
+    A bucket is scanned exactly until it holds ann_min_entries entries, then
+    moves to an HNSW graph if hnswlib is installed.
+    """
+
+    def __init__(self, dim, threshold=0.95, ttl=86400, max_entries=10000, ann_min_entries=2000):
+        self.dim = dim
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.ann_min_entries = ann_min_entries
+        self._buckets = {}
+        self._next_label = 0
+        self._lock = threading.Lock()
+
+    def lookup(self, vector, scope=""):
+        """Return the cached payload most similar to vector, or None below the threshold"""
+        with self._lock:
+            bucket = self._buckets.get(scope)
+            if not bucket or not bucket["entries"]:
+                return None
+
+            label, similarity = bucket["index"].nearest(vector)
+            if similarity < self.threshold:
+                return None
+
+            stored_at, payload = bucket["entries"][label]
+            if time.time() - stored_at >= self.ttl:
+                return None
+            return payload
+
+    def add(self, vector, payload, scope=""):
+        """Store payload under vector, dropping expired and oldest entries as needed"""
+        vector = np.asarray(vector, dtype=np.float32).reshape(1, self.dim)
+        now = time.time()
+
+        with self._lock:
+            bucket = self._buckets.setdefault(scope, {
+                "index": _FlatIndex(self.dim),
+                "entries": OrderedDict()
+            })
+            entries = bucket["entries"]
+
+            # Entries are kept in insertion order, so the expired and the
+            # oldest ones are always at the front
+            stale = []
+            for label, (stored_at, _) in entries.items():
+                if now - stored_at < self.ttl and len(entries) - len(stale) < self.max_entries:
+                    break
+                stale.append(label)
+            if stale:
+                bucket["index"].remove(set(stale))
+                for label in stale:
+                    del entries[label]
+
+            if (hnswlib is not None and isinstance(bucket["index"], _FlatIndex)
+                    and len(entries) + 1 >= self.ann_min_entries):
+                bucket["index"] = _HNSWIndex.from_flat(bucket["index"], self.max_entries)
+
+            label = self._next_label
+            self._next_label += 1
+            bucket["index"].add(vector, label)
+            entries[label] = (now, payload)
+
+    def clear(self):
+        """Drop every cached entry"""
+        with self._lock:
+            self._buckets.clear()
+
+
+def content_tokens(text):
+    """Lower-cased word tokens long enough to carry content"""
+    return {token for token in _TOKEN_PATTERN.findall((text or "").lower()) if len(token) >= 4}
+
+
+class GroundedCache(SemanticCache):
+    """Semantic cache whose hits must be re-validated against fresh search evidence.
+
+    A candidate found by query similarity (G1) is only served if the newly
+    retrieved chunks overlap the cached ones (G2), the shared chunks have not
+    changed version (G3), and the cached answer is still covered by the new
+    evidence (G4). Anything else falls through to generation.
+    """
+
+    def __init__(self, dim, threshold=0.95, ttl=86400, max_entries=10000, ann_min_entries=2000,
+                 min_jaccard=0.7, min_coverage=0.7):
+        super().__init__(dim, threshold=threshold, ttl=ttl, max_entries=max_entries,
+                         ann_min_entries=ann_min_entries)
+        self.min_jaccard = min_jaccard
+        self.min_coverage = min_coverage
+
+    def add_answer(self, vector, answer, chunk_versions, scope=""):
+        """Cache an answer together with the evidence it was generated from"""
+        self.add(vector, {
+            "answer": answer,
+            "chunk_ids": frozenset(chunk_versions),
+            "versions": dict(chunk_versions),
+            "answer_tokens": content_tokens(answer)
+        }, scope)
+
+    def validate(self, entry, chunk_versions, context):
+        """Return the name of the first failing gate, or None if the hit is safe"""
+        new_ids = frozenset(chunk_versions)
+        union = new_ids | entry["chunk_ids"]
+        shared = new_ids & entry["chunk_ids"]
+        if not union or len(shared) / len(union) < self.min_jaccard:
+            return "G2"
+
+        if any(entry["versions"].get(chunk_id) != chunk_versions.get(chunk_id) for chunk_id in shared):
+            return "G3"
+
+        answer_tokens = entry["answer_tokens"]
+        if answer_tokens:
+            covered = len(answer_tokens & content_tokens(context)) / len(answer_tokens)
+            if covered < self.min_coverage:
+                return "G4"
+
+        return None
+
+
+class ExactCache:
+    """LRU cache of chat payloads keyed by an exact request key, with a TTL"""
+
+    def __init__(self, max_entries=1024, ttl=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        """Return the cached payload for key, or None if missing or expired"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored_at, payload = entry
+        if time.time() - stored_at >= self.ttl:
+            self._entries.pop(key, None)
+            return None
+        self._entries.move_to_end(key)
+        return payload
+
+    def set(self, key, payload):
+        """Store payload under key, evicting the least recently used entry at capacity"""
+        self._entries[key] = (time.time(), payload)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop every cached entry"""
+        self._entries.clear()
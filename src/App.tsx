@@ -712,6 +712,9 @@ const RAGChatbot = () => {
     setQueryCount(prev => prev + 1);
     setError(null);
 
+    const botMessageId = messages.length + 2;
+    let streamStarted = false;
+
     try {
       // Prepare filters for Flask backend (simplified)
       const filters: ChatFilters = {};
@@ -724,14 +727,30 @@ const RAGChatbot = () => {
         filters.file_type = selectedCategories[0]; // Flask only supports single file_type
       }
 
-      // Use Flask service to process the query
-      const chatResult = await flaskService.sendChatMessage({
+      // Stream the answer into the chat as it is generated
+      const chatResult = await flaskService.streamChatMessage({
         query: messageText,
         filters
+      }, (answerSoFar) => {
+        if (!streamStarted) {
+          streamStarted = true;
+          setIsLoading(false);
+          setMessages(prev => [...prev, {
+            id: botMessageId,
+            type: 'bot',
+            content: answerSoFar,
+            timestamp: new Date(),
+            sources: [],
+            model: selectedModel,
+            temperature: temperature
+          }]);
+        } else {
+          setMessages(prev => prev.map(m => m.id === botMessageId ? { ...m, content: answerSoFar } : m));
+        }
       });
 
       const botResponse: Message = {
-        id: messages.length + 2,
+        id: botMessageId,
         type: 'bot',
         content: chatResult.answer,
         timestamp: new Date(),
@@ -743,7 +762,7 @@ const RAGChatbot = () => {
         temperature: temperature
       };
 
-      setMessages(prev => [...prev, botResponse]);
+      setMessages(prev => [...prev.filter(m => m.id !== botMessageId), botResponse]);
 
       // Text-to-speech if enabled
       if (audioEnabled && 'speechSynthesis' in window) {
@@ -769,7 +788,7 @@ const RAGChatbot = () => {
       }
 
       const errorResponse: Message = {
-        id: messages.length + 2,
+        id: botMessageId,
         type: 'bot',
         content: errorMessage,
         timestamp: new Date(),
@@ -781,7 +800,7 @@ const RAGChatbot = () => {
         temperature: temperature
       };
 
-      setMessages(prev => [...prev, errorResponse]);
+      setMessages(prev => [...prev.filter(m => m.id !== botMessageId), errorResponse]);
     } finally {
       setIsLoading(false);
     }
@@ -15,6 +15,15 @@ export interface ChatResponse {
   answer: string;
 }
 
+// Frame sent by /chat/stream: the sources first, then answer deltas, then done: true
+interface ChatStreamFrame {
+  sources?: Record<string, string>[];
+  result_count?: number;
+  delta?: string;
+  done?: boolean;
+  error?: string;
+}
+
 export interface FilterOptions {
   authors: string[];
   file_types: string[];
@@ -101,6 +110,69 @@ class FlaskService {
     });
   }
 
+  // Streams the answer over Server-Sent Events, calling onDelta with the answer so far
+  async streamChatMessage(request: ChatRequest, onDelta: (answer: string) => void): Promise<ChatResponse> {
+    let response: Response;
+    try {
+      response = await fetch(`${this.baseURL}/chat/stream`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(request),
+      });
+    } catch (error) {
+      console.error('API request failed:', error);
+      throw new FlaskServiceError(
+        `Failed to connect to backend: ${error instanceof Error ? error.message : 'Unknown error'}`,
+        'network'
+      );
+    }
+
+    if (!response.ok || !response.body) {
+      const errorData = await response.json().catch(() => ({ detail: 'Unknown error' }));
+      throw new FlaskServiceError(
+        errorData.detail || errorData.error || `HTTP ${response.status}: ${response.statusText}`,
+        'api'
+      );
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let answer = '';
+    let finished = false;
+
+    for (;;) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      // Events are separated by a blank line; keep any partial event for the next read
+      const events = buffer.split('\n\n');
+      buffer = events.pop() ?? '';
+      for (const event of events) {
+        if (!event.startsWith('data: ')) continue;
+        const frame: ChatStreamFrame = JSON.parse(event.slice('data: '.length));
+        if (frame.error) {
+          throw new FlaskServiceError(frame.error, 'api');
+        }
+        if (frame.delta) {
+          answer += frame.delta;
+          onDelta(answer);
+        }
+        if (frame.done) {
+          finished = true;
+        }
+      }
+    }
+
+    // Without the final frame the stream was cut off (timeout, proxy, restart)
+    if (!finished) {
+      throw new FlaskServiceError('The answer stream ended before it was complete', 'api');
+    }
+
+    return { answer };
+  }
+
   async getFilterOptions(): Promise<FilterOptions> {
     return this.request<FilterOptions>('/filters');
   }